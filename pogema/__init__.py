@@ -3,12 +3,15 @@ from pogema.grid_config import GridConfig
 from pogema.integrations.make_pogema import pogema_v0
 from pogema.svg_animation.animation_wrapper import AnimationMonitor, AnimationConfig
 from pogema.a_star_policy import AStarAgent, BatchAStarAgent
+from pogema.vector_env import PogemaVectorEnv
+from pogema.subproc_vector_env import PogemaSubprocVectorEnv, PogemaAsyncEnvPool
 
 __version__ = '1.4.0a0'
 
 __all__ = [
     'GridConfig',
     'pogema_v0',
+    'PogemaVectorEnv', 'PogemaSubprocVectorEnv', 'PogemaAsyncEnvPool',
     'AStarAgent', 'BatchAStarAgent',
     "AnimationMonitor", "AnimationConfig",
 ]
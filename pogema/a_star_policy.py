@@ -3,7 +3,10 @@ from pogema import GridConfig
 
 from heapq import heappop, heappush
 
-INF = 1e7
+from pogema.utils import get_legal_moves_mask, get_direction_moves_table, VEHICLE_CAN_PASS_STOCKS
+
+MOVES = GridConfig().MOVES
+DIRECTION_MOVES = get_direction_moves_table(MOVES)
 
 
 class GridMemory:
@@ -11,10 +14,14 @@ class GridMemory:
         self._memory = np.zeros(shape=(start_r * 2 + 1, start_r * 2 + 1), dtype=np.bool_)
         self._stocks_memory = np.zeros(shape=(start_r * 2 + 1, start_r * 2 + 1), dtype=np.bool_)
         self._directions_memory = np.zeros(shape=(start_r * 2 + 1, start_r * 2 + 1), dtype=np.int32)
+        self._legal_moves = {}
 
     @staticmethod
     def _try_to_insert(x, y, source, target):
         r = source.shape[0] // 2
+        # 负下标会从另一端截取，窗口必须完全落在记忆内
+        if x - r < 0 or y - r < 0:
+            return False
         try:
             target[x - r:x + r + 1, y - r:y + r + 1] = source
             return True
@@ -26,6 +33,7 @@ class GridMemory:
         s = self._stocks_memory
         d = self._directions_memory
         r = self._memory.shape[0]
+        self._legal_moves = {}
         self._memory = np.zeros(shape=(r * 2 + 1, r * 2 + 1))
         self._stocks_memory = np.zeros(shape=(r * 2 + 1, r * 2 + 1))
         self._directions_memory = np.zeros(shape=(r * 2 + 1, r * 2 + 1), dtype=np.int32)
@@ -44,6 +52,12 @@ class GridMemory:
                 break
             self._increase_memory()
 
+        # 只有写入的窗口及其外一圈的合法移动会改变，其余部分保留缓存
+        window_r = obstacles.shape[0] // 2
+        x0, x1, y0, y1 = r + x - window_r, r + x + window_r + 1, r + y - window_r, r + y + window_r + 1
+        for vehicle_type, legal_moves in self._legal_moves.items():
+            legal_moves[x0:x1 + 2, y0:y1 + 2] = self._compute_legal_moves(vehicle_type, x0, x1, y0, y1)
+
     def is_obstacle(self, x, y):
         r = self._memory.shape[0] // 2
         if -r <= x <= r and -r <= y <= r:
@@ -72,14 +86,8 @@ class GridMemory:
         
         # 然后检查是否有货物
         if self.has_stocks(x, y):
-            # 根据车辆类型和货物类型判断通行能力
-            # 这里可以扩展为更复杂的逻辑
-            vehicle_capabilities = {
-                'small': True,      # 小车可以通过货物位置
-                'standard': False,  # 标准车不能通过货物位置
-                'heavy': False,     # 重型车不能通过货物位置
-            }
-            return vehicle_capabilities.get(vehicle_type, False)
+            # 根据车辆类型判断通行能力
+            return VEHICLE_CAN_PASS_STOCKS.get(vehicle_type, False)
         
         # 如果既不是障碍物也没有货物，则可以通过
         return True
@@ -99,41 +107,59 @@ class GridMemory:
         :param to_x, to_y: 目标位置
         :return: True if valid, False otherwise
         """
-        direction_type = self.get_direction_type(from_x, from_y)
-        
-        dx = to_x - from_x
-        dy = to_y - from_y
-        
+        move = [to_x - from_x, to_y - from_y]
+
         # 检查是否为相邻移动
-        if abs(dx) + abs(dy) != 1:
+        if abs(move[0]) + abs(move[1]) != 1 or move not in MOVES:
             return False
-            
-        if direction_type == 0:  # 全方向
-            return True
-        elif direction_type == 1:  # 左右方向
-            return dy != 0 and dx == 0  # 只能左右移动
-        elif direction_type == 2:  # 上下方向
-            return dx != 0 and dy == 0  # 只能上下移动
-        
-        return False
 
+        direction_type = self.get_direction_type(from_x, from_y)
+        if not 0 <= direction_type < len(DIRECTION_MOVES):
+            return False
+        return bool(DIRECTION_MOVES[direction_type] >> MOVES.index(move) & 1)
+
+    def _compute_legal_moves(self, vehicle_type, x0, x1, y0, y1):
+        """
+        计算记忆中 [x0 - 1, x1 + 1) x [y0 - 1, y1 + 1) 区域的合法移动掩码，记忆之外视为可通行
+        """
+        size = self._memory.shape[0]
+        lx, hx, ly, hy = max(x0 - 2, 0), min(x1 + 2, size), max(y0 - 2, 0), min(y1 + 2, size)
+        pad = ((lx - x0 + 2, x1 + 2 - hx), (ly - y0 + 2, y1 + 2 - hy))
+        blocked = self._memory[lx:hx, ly:hy].astype(bool)
+        if not VEHICLE_CAN_PASS_STOCKS.get(vehicle_type, False):
+            blocked = blocked | self._stocks_memory[lx:hx, ly:hy].astype(bool)
+        legal_moves = get_legal_moves_mask(np.pad(blocked, pad), np.pad(self._directions_memory[lx:hx, ly:hy], pad),
+                                           MOVES, outside_blocked=False)
+        return legal_moves[1:-1, 1:-1]
+
+    def get_legal_moves(self, vehicle_type='standard'):
+        """
+        获取合法移动的位掩码（考虑障碍物、货物和方向限制），第 i 位表示 MOVES[i] 是否允许。
+        掩码比记忆区域多一圈边界，未知区域视为可通行。
+        :param vehicle_type: 车辆类型 ('small', 'standard', 'heavy')
+        :return: uint8 矩阵，中心对应坐标 (0, 0)
+        """
+        if vehicle_type not in self._legal_moves:
+            size = self._memory.shape[0]
+            legal_moves = self._compute_legal_moves(vehicle_type, 0, size, 0, size)
+            # 连续存储，A* 直接按一维下标读取而不复制
+            self._legal_moves[vehicle_type] = np.ascontiguousarray(legal_moves)
+        return self._legal_moves[vehicle_type]
+
+
+class _TieBreak:
+    """
+    Cell of the open list. Entries with equal f and g are ordered by the coordinates the same way as before
+    (x < other.x or y < other.y), so the search expands the cells in the same order and returns the same paths.
+    """
+    __slots__ = ('x', 'y')
 
-class Node:
-    def __init__(self, coord=None, g: int = 0, h: int = 0):
-        if coord is None:
-            coord = (INF, INF)
-        self.i, self.j = coord
-        self.g = g
-        self.h = h
-        self.f = g + h
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
 
     def __lt__(self, other):
-        if self.f != other.f:
-            return self.f < other.f
-        elif self.g != other.g:
-            return self.g < other.g
-        else:
-            return self.i < other.i or self.j < other.j
+        return self.x < other.x or self.y < other.y
 
 
 def h(node, target):
@@ -152,31 +178,49 @@ def a_star_vehicle_aware(start, target, grid: GridMemory, vehicle_type='standard
     :param max_steps: 最大搜索步数
     :return: 路径列表
     """
-    open_ = list()
-    closed = {start: None}
-
-    heappush(open_, Node(start, 0, h(start, target)))
-
-    for step in range(int(max_steps)):
-        u = heappop(open_)
-
-        for n in [(u.i - 1, u.j), (u.i + 1, u.j), (u.i, u.j - 1), (u.i, u.j + 1)]:
-            # 检查车辆类型和方向限制
-            if (grid.can_pass(*n, vehicle_type) and 
-                grid.is_move_valid_by_direction(u.i, u.j, *n) and 
-                n not in closed):
-                heappush(open_, Node(n, u.g + 1, h(n, target)))
-                closed[n] = (u.i, u.j)
-
-        if step >= max_steps or (u.i, u.j) == target or len(open_) == 0:
+    # 车辆类型和方向限制都预先计算在合法移动掩码中，记忆之外所有移动都合法
+    legal_moves = grid.get_legal_moves(vehicle_type)
+    size = legal_moves.shape[0]
+    offset = size // 2
+    moves_mask = legal_moves.ravel().data
+    all_moves = (1 << len(MOVES)) - 1
+
+    sx, sy = start
+    tx, ty = target
+    # cells are numbered x * stride + y, the search can't get further than max_steps from the start
+    stride = 2 * (abs(sy) + abs(ty) + int(max_steps)) + 3
+    neighbours = [(1 << action, dx, dy, dx * stride + dy) for action, (dx, dy) in enumerate(MOVES) if action]
+    # parent of each reached cell, the start is its own parent
+    parents = {sx * stride + sy: sx * stride + sy}
+    open_ = [(abs(sx - tx) + abs(sy - ty), 0, _TieBreak(sx, sy))]
+
+    push, pop = heappush, heappop
+    for _ in range(int(max_steps)):
+        _, g, u = pop(open_)
+        x, y = u.x, u.y
+        mx, my = x + offset, y + offset
+        mask = moves_mask[mx * size + my] if 0 <= mx < size and 0 <= my < size else all_moves
+        cell = x * stride + y
+        g += 1
+        for bit, dx, dy, delta in neighbours:
+            if mask & bit:
+                n = cell + delta
+                if n not in parents:
+                    parents[n] = cell
+                    nx, ny = x + dx, y + dy
+                    push(open_, (g + abs(nx - tx) + abs(ny - ty), g, _TieBreak(nx, ny)))
+
+        if (x == tx and y == ty) or not open_:
             break
 
-    next_node = target if target in closed else None
-    path = []
-    while next_node is not None:
-        path.append(next_node)
-        next_node = closed[next_node]
-
+    cell = tx * stride + ty
+    if cell not in parents:
+        return []
+    path = [tuple(target)]
+    while parents[cell] != cell:
+        cell = parents[cell]
+        x, y = divmod(cell + stride // 2, stride)
+        path.append((x, y - stride // 2))
     return list(reversed(path))
 
 
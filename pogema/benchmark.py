@@ -0,0 +1,185 @@
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+from typing import NamedTuple, Callable, Optional
+
+import numpy as np
+
+from pogema import __version__
+from pogema.a_star_policy import GridMemory, a_star_vehicle_aware
+from pogema.generator import generate_obstacles, label_components, generate_positions_and_targets_fast
+from pogema.grid import Grid, GridLifeLong
+from pogema.grid_config import GridConfig
+
+
+class Benchmark(NamedTuple):
+    # prepares the inputs, isn't timed
+    setup: Callable
+    # timed part, gets the result of the setup
+    run: Callable
+    # larger maps are skipped
+    max_size: Optional[int] = None
+
+
+def _setup_placement(grid_config):
+    obstacles = generate_obstacles(grid_config)
+    return obstacles, grid_config, label_components(obstacles, grid_config)
+
+
+def _setup_reset(grid_config):
+    grid = Grid(grid_config)
+    return grid, grid_config.seed + 1
+
+
+# number of the agents planning in the A* benchmarks
+_A_STAR_AGENTS = 64
+# distance to the targets in the short path benchmark
+_A_STAR_SHORT = 3
+
+
+def _setup_a_star(grid_config, max_distance=None):
+    """
+    Builds the memory of the observed windows of the agents, as A* agents do, and the plans of the first agents.
+    :param max_distance: if set, the targets are replaced by the cells at this distance along the paths
+    :return: memory and list of (start, target)
+    """
+    grid = Grid(grid_config)
+    memory = GridMemory()
+    for agent_idx, (x, y) in enumerate(grid.agents_xy.tolist()):
+        memory.update(x, y, grid.get_obstacles_for_agent(agent_idx))
+    memory.get_legal_moves()
+
+    plans = []
+    for start, target in zip(grid.agents_xy[:_A_STAR_AGENTS].tolist(), grid.targets_xy[:_A_STAR_AGENTS].tolist()):
+        start, target = tuple(start), tuple(target)
+        if max_distance is not None:
+            path = a_star_vehicle_aware(start, target, memory)
+            target = path[min(max_distance, len(path) - 1)] if path else start
+        plans.append((start, target))
+    return memory, plans
+
+
+def _run_a_star(args):
+    memory, plans = args
+    for start, target in plans:
+        a_star_vehicle_aware(start, target, memory)
+
+
+BENCHMARKS = {
+    'generate_obstacles': Benchmark(setup=lambda c: c, run=generate_obstacles),
+    'label_components': Benchmark(setup=lambda c: (generate_obstacles(c), c),
+                                  run=lambda args: label_components(*args)),
+    'placement': Benchmark(setup=_setup_placement, run=lambda args: generate_positions_and_targets_fast(*args)),
+    'grid_init': Benchmark(setup=lambda c: c, run=Grid),
+    'add_artificial_border': Benchmark(setup=lambda c: Grid(c, add_artificial_border=False),
+                                       run=lambda grid: grid.add_artificial_border()),
+    'grid_lifelong': Benchmark(setup=lambda c: c, run=GridLifeLong),
+    'reset_agents': Benchmark(setup=_setup_reset, run=lambda args: args[0].reset_agents(args[1])),
+    'a_star': Benchmark(setup=_setup_a_star, run=_run_a_star, max_size=512),
+    'a_star_short': Benchmark(setup=lambda c: _setup_a_star(c, _A_STAR_SHORT), run=_run_a_star, max_size=512),
+}
+
+DEFAULT_SIZES = (32, 128, 512, 1024, 2048, 4096)
+DEFAULT_DENSITIES = (0.1, 0.3)
+DEFAULT_NUM_AGENTS = (16, 256, 4096)
+
+
+def is_feasible(size, density, num_agents):
+    # every agent needs a start and a target, the maps with too few free cells fail to place them
+    return 2 * num_agents <= size * size * (1 - density) / 2
+
+
+def time_benchmark(benchmark: Benchmark, grid_config: GridConfig, repeats=3):
+    """
+    Times the run of the benchmark, the setup is done before every repeat with the seed equal to the repeat index.
+    :return: list of the times in seconds
+    """
+    times = []
+    for repeat in range(repeats):
+        args = benchmark.setup(grid_config.copy(update=dict(seed=repeat)))
+        start = time.perf_counter()
+        benchmark.run(args)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def run_benchmarks(names=None, sizes=DEFAULT_SIZES, densities=DEFAULT_DENSITIES, num_agents=DEFAULT_NUM_AGENTS,
+                   repeats=3, verbose=False):
+    """
+    Sweeps the benchmarks over the sizes, densities and numbers of agents, the infeasible combinations and the sizes
+    above max_size of the benchmark are skipped.
+    :return: dict with the environment description and the list of the results
+    """
+    results = []
+    for name in names or BENCHMARKS:
+        max_size = BENCHMARKS[name].max_size
+        for size in sizes:
+            if max_size is not None and size > max_size:
+                continue
+            for density in densities:
+                for agents in num_agents:
+                    if not is_feasible(size, density, agents):
+                        continue
+                    grid_config = GridConfig(size=size, density=density, num_agents=agents)
+                    times = time_benchmark(BENCHMARKS[name], grid_config, repeats)
+                    result = dict(benchmark=name, size=size, density=density, num_agents=agents, times=times,
+                                  min=min(times), median=statistics.median(times))
+                    results.append(result)
+                    if verbose:
+                        print(f"{name:>22} size={size:<5} density={density:<4} num_agents={agents:<6} "
+                              f"min={result['min']:.4f}s median={result['median']:.4f}s", flush=True)
+
+    return dict(pogema_version=__version__, numpy_version=np.__version__, python_version=platform.python_version(),
+                platform=platform.platform(), timestamp=time.strftime('%Y-%m-%dT%H:%M:%S'), results=results)
+
+
+def _result_key(result):
+    return result['benchmark'], result['size'], result['density'], result['num_agents']
+
+
+def compare(baseline, current, threshold=1.2):
+    """
+    Compares the min times of the same benchmarks and parameters.
+    :return: list of (key, baseline time, current time) of the results which are slower than threshold * baseline
+    """
+    baseline_times = {_result_key(result): result['min'] for result in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        key = _result_key(result)
+        if key in baseline_times and result['min'] > threshold * baseline_times[key]:
+            regressions.append((key, baseline_times[key], result['min']))
+    return regressions
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Benchmarks of the map generation, resets and A* planning of pogema.')
+    parser.add_argument('--benchmarks', nargs='+', choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument('--sizes', nargs='+', type=int, default=list(DEFAULT_SIZES))
+    parser.add_argument('--densities', nargs='+', type=float, default=list(DEFAULT_DENSITIES))
+    parser.add_argument('--num_agents', nargs='+', type=int, default=list(DEFAULT_NUM_AGENTS))
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--output', type=str, default=None, help='path of the JSON results')
+    parser.add_argument('--baseline', type=str, default=None, help='path of the JSON results to compare with')
+    parser.add_argument('--threshold', type=float, default=1.2, help='slowdown reported as a regression')
+    args = parser.parse_args(args)
+
+    report = run_benchmarks(args.benchmarks, args.sizes, args.densities, args.num_agents, args.repeats, verbose=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(json.load(f), report, args.threshold)
+        for (name, size, density, agents), baseline_time, current_time in regressions:
+            print(f"regression: {name} size={size} density={density} num_agents={agents} "
+                  f"{baseline_time:.4f}s -> {current_time:.4f}s")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
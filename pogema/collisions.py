@@ -0,0 +1,153 @@
+import numpy as np
+
+
+def find_occupants(current, active, cells):
+    """
+    Finds which active agent occupies each of the given cells.
+    :param current: flat cell indices of the agents, shape (num_agents,)
+    :param active: bool mask of the active agents
+    :param cells: flat cell indices to look up
+    :return: index of the active agent standing on each cell or -1 for an empty cell
+    """
+    active_ids = np.flatnonzero(active)
+    order = np.argsort(current[active_ids], kind='stable')
+    sorted_cells = current[active_ids][order]
+    if not len(sorted_cells):
+        return np.full(len(cells), -1, dtype=np.int64)
+    found = np.minimum(np.searchsorted(sorted_cells, cells), len(sorted_cells) - 1)
+    return np.where(sorted_cells[found] == cells, active_ids[order][found], -1)
+
+
+def _first_per_cell(agent_ids, cells):
+    """
+    Returns the bool mask of agents that have the lowest index among the agents sharing the same cell.
+    Expects agent_ids to be sorted ascending.
+    """
+    first = np.zeros(len(agent_ids), dtype=bool)
+    if len(agent_ids):
+        _, first_idx = np.unique(cells, return_index=True)
+        first[first_idx] = True
+    return first
+
+
+def resolve_priority(current, desired, active, legal, occupants=None):
+    """
+    Resolves the moves the same way as calling Grid.move for every active agent in the order of their indices:
+    an agent moves only if the move is legal and the desired cell is not occupied at the moment of its turn.
+    :param current: flat cell indices of the agents, shape (num_agents,)
+    :param desired: flat cell indices the agents try to move to
+    :param active: bool mask of the active agents
+    :param legal: bool mask, True if the move is legal (e.g. the desired cell is free of obstacles)
+    :param occupants: optional precomputed index of the active agent standing on each desired cell or -1
+    :return: flat cell indices of the agents after the moves
+    """
+    num_agents = len(current)
+    moving = active & (desired != current) & legal
+    if occupants is None:
+        occupants = find_occupants(current, active, desired)
+
+    # 1 - moves, 0 - stays, -1 - depends on whether the agent standing on the desired cell moves away
+    status = np.zeros(num_agents, dtype=np.int8)
+    parent = np.arange(num_agents)
+
+    # the first agent heading to an empty cell always takes it
+    to_empty = np.flatnonzero(moving & (occupants < 0))
+    status[to_empty[_first_per_cell(to_empty, desired[to_empty])]] = 1
+
+    # a cell occupied by an agent with a lower index can be taken by the next agent in order, if its owner leaves;
+    # agents with lower indices than the owner see the cell occupied and stay
+    agent_ids = np.arange(num_agents)
+    after_owner = np.flatnonzero(moving & (occupants >= 0) & (occupants < agent_ids))
+    candidates = after_owner[_first_per_cell(after_owner, desired[after_owner])]
+    status[candidates] = -1
+    parent[candidates] = occupants[candidates]
+
+    # the owners always have lower indices, so the dependency chains end up in resolved agents
+    _resolve_dependencies(status, parent, candidates)
+
+    return np.where(status == 1, desired, current)
+
+
+def _resolve_dependencies(status, parent, pending):
+    """
+    Copies the status of the agent each pending agent depends on, using pointer jumping, so chains of any length
+    are resolved in a logarithmic number of passes. Agents that are still pending afterwards depend on each other
+    in cycles and are returned.
+    :param status: int8 array, 1 - moves, 0 - stays, -1 - pending
+    :param parent: index of the agent each pending agent depends on, resolved agents point to themselves
+    :param pending: indices of the pending agents
+    """
+    for _ in range(len(status).bit_length() + 1):
+        if not len(pending):
+            break
+        resolved = status[parent[pending]] >= 0
+        status[pending[resolved]] = status[parent[pending[resolved]]]
+        pending = pending[~resolved]
+        parent[pending] = parent[parent[pending]]
+    return pending
+
+
+def resolve_block_both(current, desired, active, legal, occupants=None):
+    """
+    Resolves the moves of the 'block_both' collision system: an agent stays if its desired cell is occupied by
+    any active agent or is desired by more than one agent.
+    :param current: flat cell indices of the agents, shape (num_agents,)
+    :param desired: flat cell indices the agents try to move to
+    :param active: bool mask of the active agents
+    :param legal: bool mask, True if the move is legal (e.g. the desired cell is free of obstacles)
+    :param occupants: optional precomputed index of the active agent standing on each desired cell or -1
+    :return: flat cell indices of the agents after the moves
+    """
+    if occupants is None:
+        occupants = find_occupants(current, active, desired)
+    active_ids = np.flatnonzero(active)
+    targets = desired[active_ids]
+    cells, counts = np.unique(targets, return_counts=True)
+    blocked = np.isin(targets, cells[counts > 1]) | (occupants[active_ids] >= 0)
+    moving = active_ids[legal[active_ids] & ~blocked]
+
+    result = current.copy()
+    result[moving] = desired[moving]
+    return result
+
+
+def resolve_soft(current, desired, active, legal, occupants=None):
+    """
+    Resolves the moves of the 'soft' collision system. The result is the same as of the recursive reverting of
+    conflicting moves, without recursion:
+    agents swapping their cells stay, agents making illegal moves (e.g. into obstacles) stay, among the agents heading
+    to the same cell only the one with the lowest index may move, and it moves only if the cell is empty or its owner
+    moves away as well.
+    Agents moving along a cycle (e.g. rotating in a 2x2 square) all move.
+    :param current: flat cell indices of the agents, shape (num_agents,)
+    :param desired: flat cell indices the agents try to move to
+    :param active: bool mask of the active agents
+    :param legal: bool mask, True if the move is legal (e.g. the desired cell is free of obstacles)
+    :param occupants: optional precomputed index of the active agent standing on each desired cell or -1
+    :return: flat cell indices of the agents after the moves
+    """
+    num_agents = len(current)
+    agent_ids = np.arange(num_agents)
+    if occupants is None:
+        occupants = find_occupants(current, active, desired)
+    owned = occupants >= 0
+    owners = np.where(owned, occupants, agent_ids)
+
+    moving = active & (desired != current)
+    # of two agents swapping their cells the one with the lower index withdraws its move,
+    # its partner then runs into the occupied cell and stays as well
+    swapping = moving & owned & (desired[owners] == current)
+    candidates = np.flatnonzero(moving & legal & ~(swapping & (agent_ids < owners)))
+    winners = candidates[_first_per_cell(candidates, desired[candidates])]
+
+    status = np.zeros(num_agents, dtype=np.int8)
+    status[winners[~owned[winners]]] = 1
+    dependent = winners[owned[winners]]
+    status[dependent] = -1
+    parent = agent_ids.copy()
+    parent[dependent] = owners[dependent]
+
+    in_cycles = _resolve_dependencies(status, parent, dependent)
+    status[in_cycles] = 1
+
+    return np.where(status == 1, desired, current)
@@ -4,12 +4,13 @@ import numpy as np
 import gymnasium
 from gymnasium.error import ResetNeeded
 
+from pogema.functional import move_agents, apply_on_target
 from pogema.grid import Grid, GridLifeLong
 from pogema.grid_config import GridConfig
 from pogema.wrappers.metrics import LifeLongAverageThroughputMetric, NonDisappearEpLengthMetric, \
     NonDisappearCSRMetric, NonDisappearISRMetric, EpLengthMetric, ISRMetric, CSRMetric, SumOfCostsAndMakespanMetric
 from pogema.wrappers.multi_time_limit import MultiTimeLimit
-from pogema.generator import generate_new_target, generate_from_possible_targets
+from pogema.generator import generate_new_targets, sample_cells
 from pogema.wrappers.persistence import PersistentWrapper
 
 
@@ -29,6 +30,12 @@ class ActionsSampler:
     def sample_actions(self, dim=1):
         return self._rnd.integers(self._num_actions, size=dim)
 
+    def get_state(self):
+        return self._rnd.bit_generator.state
+
+    def set_state(self, state):
+        self._rnd.bit_generator.state = state
+
 
 class PogemaBase(gymnasium.Env):
     """
@@ -63,6 +70,22 @@ class PogemaBase(gymnasium.Env):
             self.grid.get_square_target(agent_id)[None]
         ])
 
+    def _get_agents_obs_batch(self, out=None):
+        """
+        Returns the observations of all agents as one contiguous (num_agents, 4, 2r+1, 2r+1) float32 array.
+        The channels are the same as in _get_agents_obs.
+        :param out: optional array of that shape to write the observations into
+        :return:
+        """
+        if out is None:
+            full_size = self.grid_config.obs_radius * 2 + 1
+            out = np.empty((self.grid_config.num_agents, 4, full_size, full_size), dtype=np.float32)
+        self.grid.get_obstacles_for_agents(out=out[:, 0])
+        self.grid.get_stocks_for_agents(out=out[:, 1])
+        self.grid.get_positions_for_agents(out=out[:, 2])
+        self.grid.get_square_targets(out=out[:, 3])
+        return out
+
     def check_reset(self):
         """
         Checks if the reset needed.
@@ -99,7 +122,10 @@ class Pogema(PogemaBase):
     def __init__(self, grid_config=GridConfig(num_agents=2)):
         super().__init__(grid_config)
         self.was_on_goal = None
+        self._obs_buffer = None
         full_size = self.grid_config.obs_radius * 2 + 1
+        if self.grid_config.reuse_obs_buffer:
+            self.set_obs_buffer(np.zeros((self.grid_config.num_agents, 4, full_size, full_size), dtype=np.float32))
         if self.grid_config.observation_type == 'default':
             self.observation_space = gymnasium.spaces.Box(-1.0, 1.0, shape=(3, full_size, full_size))
         elif self.grid_config.observation_type == 'POMAPF':
@@ -108,6 +134,7 @@ class Pogema(PogemaBase):
                 agents=gymnasium.spaces.Box(0.0, 1.0, shape=(full_size, full_size)),
                 xy=gymnasium.spaces.Box(low=-1024, high=1024, shape=(2,), dtype=int),
                 target_xy=gymnasium.spaces.Box(low=-1024, high=1024, shape=(2,), dtype=int),
+                action_mask=gymnasium.spaces.MultiBinary(len(self.grid_config.MOVES)),
             )
         elif self.grid_config.observation_type == 'MAPF':
             self.observation_space: gymnasium.spaces.Dict = gymnasium.spaces.Dict(
@@ -115,6 +142,7 @@ class Pogema(PogemaBase):
                 agents=gymnasium.spaces.Box(0.0, 1.0, shape=(full_size, full_size)),
                 xy=gymnasium.spaces.Box(low=-1024, high=1024, shape=(2,), dtype=int),
                 target_xy=gymnasium.spaces.Box(low=-1024, high=1024, shape=(2,), dtype=int),
+                action_mask=gymnasium.spaces.MultiBinary(len(self.grid_config.MOVES)),
                 # global_obstacles=None, # todo define shapes of global state variables
                 # global_xy=None,
                 # global_target_xy=None,
@@ -124,26 +152,15 @@ class Pogema(PogemaBase):
 
     def step(self, action: list):
         assert len(action) == self.grid_config.num_agents
-        rewards = []
-
-        terminated = []
 
         self.move_agents(action)
         self.update_was_on_goal()
 
-        for agent_idx in range(self.grid_config.num_agents):
-
-            on_goal = self.grid.on_goal(agent_idx)
-            if on_goal and self.grid.is_active[agent_idx]:
-                rewards.append(1.0)
-            else:
-                rewards.append(0.0)
-            terminated.append(on_goal)
+        state, rewards, terminated = apply_on_target(self.grid.get_agents_state(), 'finish')
+        rewards, terminated = rewards.tolist(), terminated.tolist()
 
-        for agent_idx in range(self.grid_config.num_agents):
-            if self.grid.on_goal(agent_idx):
-                self.grid.hide_agent(agent_idx)
-                self.grid.is_active[agent_idx] = False
+        for agent_idx in np.flatnonzero(self.grid.active & ~state.active):
+            self.grid.hide_agent(agent_idx)
 
         infos = self._get_infos()
 
@@ -155,23 +172,51 @@ class Pogema(PogemaBase):
         self.grid: Grid = Grid(grid_config=self.grid_config)
 
     def update_was_on_goal(self):
-        self.was_on_goal = [self.grid.on_goal(agent_idx) and self.grid.is_active[agent_idx]
-                            for agent_idx in range(self.grid_config.num_agents)]
+        self.was_on_goal = (self.grid.on_goal_mask() & self.grid.active).tolist()
+
+    def _reset_grid(self, seed=None):
+        """
+        Re-samples the agents and targets on the current map, keeping its static layers.
+        """
+        self.grid.reset_agents(seed)
 
     def reset(self, seed: Optional[int] = None, return_info: bool = True, options: Optional[dict] = None, ):
-        self._initialize_grid()
+        if self.grid_config.fast_reset and self.grid is not None:
+            self._reset_grid(seed)
+        else:
+            self._initialize_grid()
+            if seed is not None:
+                self.grid.seed = seed
         self.update_was_on_goal()
 
-        if seed is not None:
-            self.grid.seed = seed
-
         if return_info:
             return self._obs(), self._get_infos()
         return self._obs()
 
+    def set_obs_buffer(self, buffer):
+        """
+        Makes the environment write 'default' observations in place into the given buffer instead of allocating
+        new arrays every step. The observations returned by step and reset become views of this buffer, so they are
+        overwritten by the next step or reset. Copy them if you need to keep them.
+        :param buffer: float32 array of shape (num_agents, 4, 2r+1, 2r+1), or None to allocate new arrays again
+        :return:
+        """
+        if buffer is not None:
+            if self.grid_config.observation_type != 'default':
+                raise ValueError("Observation buffer is supported only for 'default' observation_type")
+            full_size = self.grid_config.obs_radius * 2 + 1
+            expected_shape = (self.grid_config.num_agents, 4, full_size, full_size)
+            if buffer.shape != expected_shape or buffer.dtype != np.float32:
+                raise ValueError(f"Observation buffer must be float32 array of shape {expected_shape}, "
+                                 f"got {buffer.dtype} array of shape {buffer.shape}")
+        self._obs_buffer = buffer
+
+    def get_obs_buffer(self):
+        return self._obs_buffer
+
     def _obs(self):
         if self.grid_config.observation_type == 'default':
-            return [self._get_agents_obs(index) for index in range(self.grid_config.num_agents)]
+            return list(self._get_agents_obs_batch(out=self._obs_buffer))
         elif self.grid_config.observation_type == 'POMAPF':
             return self._pomapf_obs()
 
@@ -196,82 +241,59 @@ class Pogema(PogemaBase):
         agents_xy_relative = self.grid.get_agents_xy_relative()
         targets_xy_relative = self.grid.get_targets_xy_relative()
 
+        obstacles = self.grid.get_obstacles_for_agents()
+        stocks = self.grid.get_stocks_for_agents()
+        directions = self.grid.get_directions_for_agents()
+        agents = self.grid.get_positions_for_agents()
+        action_masks = self.grid.get_action_masks()
+
         for agent_idx in range(self.grid_config.num_agents):
-            result = {'obstacles': self.grid.get_obstacles_for_agent(agent_idx),
-                      'stocks': self.grid.get_stocks_for_agent(agent_idx),
-                      'directions': self.grid.get_directions_for_agent(agent_idx),
-                      'agents': self.grid.get_positions(agent_idx),
+            result = {'obstacles': obstacles[agent_idx],
+                      'stocks': stocks[agent_idx],
+                      'directions': directions[agent_idx],
+                      'agents': agents[agent_idx],
                       'xy': agents_xy_relative[agent_idx],
-                      'target_xy': targets_xy_relative[agent_idx]}
+                      'target_xy': targets_xy_relative[agent_idx],
+                      'action_mask': action_masks[agent_idx]}
 
             results.append(result)
         return results
 
     def _get_infos(self):
-        infos = [dict() for _ in range(self.grid_config.num_agents)]
-        for agent_idx in range(self.grid_config.num_agents):
-            infos[agent_idx]['is_active'] = self.grid.is_active[agent_idx]
-        return infos
-
-    def _revert_action(self, agent_idx, used_cells, cell, actions):
-        actions[agent_idx] = 0
-        used_cells[cell].remove(agent_idx)
-        new_cell = self.grid.positions_xy[agent_idx]
-        if new_cell in used_cells and len(used_cells[new_cell]) > 0:
-            used_cells[new_cell].append(agent_idx)
-            return self._revert_action(used_cells[new_cell][0], used_cells, new_cell, actions)
-        else:
-            used_cells.setdefault(new_cell, []).append(agent_idx)
-        return actions, used_cells
+        return [{'is_active': is_active} for is_active in self.grid.active.tolist()]
 
     def move_agents(self, actions):
-        if self.grid.config.collision_system == 'priority':
-            for agent_idx in range(self.grid_config.num_agents):
-                if self.grid.is_active[agent_idx]:
-                    self.grid.move(agent_idx, actions[agent_idx])
-        elif self.grid.config.collision_system == 'block_both':
-            used_cells = {}
-            agents_xy = self.grid.get_agents_xy()
-            for agent_idx, (x, y) in enumerate(agents_xy):
-                if self.grid.is_active[agent_idx]:
-                    dx, dy = self.grid_config.MOVES[actions[agent_idx]]
-                    used_cells[x + dx, y + dy] = 'blocked' if (x + dx, y + dy) in used_cells else 'visited'
-                    used_cells[x, y] = 'blocked'
-            for agent_idx in range(self.grid_config.num_agents):
-                if self.grid.is_active[agent_idx]:
-                    x, y = agents_xy[agent_idx]
-                    dx, dy = self.grid_config.MOVES[actions[agent_idx]]
-                    if used_cells.get((x + dx, y + dy), None) != 'blocked':
-                        self.grid.move(agent_idx, actions[agent_idx])
-        elif self.grid.config.collision_system == 'soft':
-            used_cells = dict()
-            used_edges = dict()
-            agents_xy = self.grid.get_agents_xy()
-            for agent_idx, (x, y) in enumerate(agents_xy):
-                if self.grid.is_active[agent_idx]:
-                    dx, dy = self.grid.config.MOVES[actions[agent_idx]]
-                    used_cells.setdefault((x + dx, y + dy), []).append(agent_idx)
-                    used_edges[x, y, x + dx, y + dy] = [agent_idx]
-                    if dx != 0 or dy != 0:
-                        used_edges.setdefault((x + dx, y + dy, x, y), []).append(agent_idx)
-            for agent_idx, (x, y) in enumerate(agents_xy):
-                if self.grid.is_active[agent_idx]:
-                    dx, dy = self.grid.config.MOVES[actions[agent_idx]]
-                    if len(used_edges[x, y, x + dx, y + dy]) > 1:
-                        used_cells[x + dx, y + dy].remove(agent_idx)
-                        used_cells.setdefault((x, y), []).append(agent_idx)
-                        actions[agent_idx] = 0
-            for agent_idx in reversed(range(len(agents_xy))):
-                x, y = agents_xy[agent_idx]
-                if self.grid.is_active[agent_idx]:
-                    dx, dy = self.grid.config.MOVES[actions[agent_idx]]
-                    if len(used_cells[x + dx, y + dy]) > 1 or self.grid.has_obstacle(x + dx, y + dy):
-                        actions, used_cells = self._revert_action(agent_idx, used_cells, (x + dx, y + dy), actions)
-            for agent_idx in range(self.grid_config.num_agents):
-                if self.grid.is_active[agent_idx]:
-                    self.grid.move_without_checks(agent_idx, actions[agent_idx])
-        else:
-            raise ValueError('Unknown collision system: {}'.format(self.grid.config.collision_system))
+        new_xy = move_agents(self.grid.get_agents_state(), actions, self.grid.legal_moves, self.grid.config.MOVES,
+                             self.grid.config.collision_system, occupancy=self.grid.occupancy)
+        self.grid.move_agents_to_cells(new_xy[:, 0].astype(np.int64) * self.grid.obstacles.shape[1] + new_xy[:, 1])
+
+    def get_snapshot(self):
+        """
+        Returns a compact snapshot of the dynamic state: agents positions, targets, activity flags and the state of
+        the random generators. The static layers of the grid are not copied, the snapshot only refers to the grid.
+        :return: dict which can be passed to restore
+        """
+        self.check_reset()
+        return {'grid': self.grid,
+                'agents_xy': self.grid.agents_xy.copy(),
+                'targets_xy': self.grid.targets_xy.copy(),
+                'active': self.grid.active.copy(),
+                'initial_xy': self.grid._initial_xy.copy(),
+                'was_on_goal': list(self.was_on_goal),
+                'sampler_state': self._multi_action_sampler.get_state()}
+
+    def restore(self, snapshot):
+        """
+        Restores the state saved by get_snapshot, also the one taken before the last reset.
+        """
+        self.grid = snapshot['grid']
+        self.grid.restore_agents(snapshot['agents_xy'], snapshot['targets_xy'], snapshot['active'],
+                                 snapshot['initial_xy'])
+        self.was_on_goal = list(snapshot['was_on_goal'])
+        self._multi_action_sampler.set_state(snapshot['sampler_state'])
+
+    def get_action_masks(self):
+        return self.grid.get_action_masks()
 
     def get_agents_xy_relative(self):
         return self.grid.get_agents_xy_relative()
@@ -304,44 +326,65 @@ class PogemaLifeLong(Pogema):
 
     def _initialize_grid(self):
         self.grid: GridLifeLong = GridLifeLong(grid_config=self.grid_config)
-
-        main_rng = np.random.default_rng(self.grid_config.seed)
-        seeds = main_rng.integers(np.iinfo(np.int32).max, size=self.grid_config.num_agents)
-        self.random_generators = [np.random.default_rng(seed) for seed in seeds]
-
-    def _generate_new_target(self, agent_idx):
+        self._initialize_random_generators(self.grid_config.seed)
+
+    def _reset_grid(self, seed=None):
+        super()._reset_grid(seed)
+        self._initialize_random_generators(self.grid_config.seed if seed is None else seed)
+
+    def get_snapshot(self):
+        snapshot = super().get_snapshot()
+        snapshot['targets_key'] = self._targets_key
+        snapshot['goal_counts'] = self._goal_counts.copy()
+        return snapshot
+
+    def restore(self, snapshot):
+        super().restore(snapshot)
+        self._targets_key = snapshot['targets_key']
+        self._goal_counts[...] = snapshot['goal_counts']
+
+    def _initialize_random_generators(self, seed):
+        # the new targets are drawn from the counter-based stream keyed by (seed, agent, goal index)
+        if seed is None:
+            seed = np.random.default_rng().integers(np.iinfo(np.int64).max)
+        self._targets_key = int(seed)
+        self._goal_counts = np.zeros(self.grid_config.num_agents, dtype=np.int64)
+
+    def _generate_new_targets(self, agent_ids):
+        """
+        Generates the new targets of the agents in one batched draw.
+        :param agent_ids: int array of the agents which reached their targets
+        :return: int array of shape (len(agent_ids), 2) of the new targets
+        """
+        agent_ids = np.asarray(agent_ids, dtype=np.int64).reshape(-1)
+        goal_indices = self._goal_counts[agent_ids]
+        self._goal_counts[agent_ids] += 1
+        positions_xy = self.grid.agents_xy[agent_ids]
         if self.grid_config.possible_targets_xy is not None:
-            new_goal = generate_from_possible_targets(self.random_generators[agent_idx], 
-                                                     self.grid_config.possible_targets_xy, 
-                                                     self.grid.positions_xy[agent_idx])
-            return (new_goal[0] + self.grid_config.obs_radius, new_goal[1] + self.grid_config.obs_radius)
-        else:
-            return generate_new_target(self.random_generators[agent_idx],
-                                    self.grid.point_to_component,
-                                    self.grid.component_to_points,
-                                    self.grid.positions_xy[agent_idx])
+            r, width = self.grid_config.obs_radius, self.grid.obstacles.shape[1]
+            possible_targets_xy = np.asarray(self.grid_config.possible_targets_xy, dtype=np.int64).reshape(-1, 2) + r
+            cells = possible_targets_xy[:, 0] * width + possible_targets_xy[:, 1]
+            positions = positions_xy[:, 0].astype(np.int64) * width + positions_xy[:, 1]
+            targets = sample_cells(self._targets_key, agent_ids, goal_indices, cells,
+                                   np.zeros_like(agent_ids), np.full_like(agent_ids, len(cells)), positions)
+            return np.stack(np.divmod(targets, width), axis=-1)
+        return generate_new_targets(self._targets_key, agent_ids, goal_indices, self.grid.component_index,
+                                    positions_xy)
 
     def step(self, action: list):
         assert len(action) == self.grid_config.num_agents
-        rewards = []
-
-        infos = [dict() for _ in range(self.grid_config.num_agents)]
 
         self.move_agents(action)
         self.update_was_on_goal()
 
-        for agent_idx in range(self.grid_config.num_agents):
-            on_goal = self.grid.on_goal(agent_idx)
-            if on_goal and self.grid.is_active[agent_idx]:
-                rewards.append(1.0)
-            else:
-                rewards.append(0.0)
+        _, rewards, _ = apply_on_target(self.grid.get_agents_state(), 'restart')
+        rewards = rewards.tolist()
 
-            if self.grid.on_goal(agent_idx):
-                self.grid.finishes_xy[agent_idx] = self._generate_new_target(agent_idx)
+        on_goal = np.flatnonzero(self.grid.on_goal_mask())
+        if len(on_goal):
+            self.grid.targets_xy[on_goal] = self._generate_new_targets(on_goal)
 
-        for agent_idx in range(self.grid_config.num_agents):
-            infos[agent_idx]['is_active'] = self.grid.is_active[agent_idx]
+        infos = self._get_infos()
 
         obs = self._obs()
 
@@ -362,32 +405,30 @@ class PogemaCoopFinish(Pogema):
     def step(self, action: list):
         assert len(action) == self.grid_config.num_agents
 
-        infos = [dict() for _ in range(self.grid_config.num_agents)]
-
         self.move_agents(action)
         self.update_was_on_goal()
 
-        is_task_solved = all(self.was_on_goal)
-        for agent_idx in range(self.grid_config.num_agents):
-            infos[agent_idx]['is_active'] = self.grid.is_active[agent_idx]
+        _, rewards, terminated = apply_on_target(self.grid.get_agents_state(), 'nothing')
+        infos = self._get_infos()
 
         obs = self._obs()
 
-        terminated = [is_task_solved] * self.grid_config.num_agents
         truncated = [False] * self.grid_config.num_agents
-        rewards = [1.0 if is_task_solved else 0.0 for _ in range(self.grid_config.num_agents)]
-        return obs, rewards, terminated, truncated, infos
+        return obs, rewards.tolist(), terminated.tolist(), truncated, infos
 
 
-def _make_pogema(grid_config):
+def _make_base_pogema(grid_config):
     if grid_config.on_target == 'restart':
-        env = PogemaLifeLong(grid_config=grid_config)
+        return PogemaLifeLong(grid_config=grid_config)
     elif grid_config.on_target == 'nothing':
-        env = PogemaCoopFinish(grid_config=grid_config)
+        return PogemaCoopFinish(grid_config=grid_config)
     elif grid_config.on_target == 'finish':
-        env = Pogema(grid_config=grid_config)
-    else:
-        raise KeyError(f'Unknown on_target option: {grid_config.on_target}')
+        return Pogema(grid_config=grid_config)
+    raise KeyError(f'Unknown on_target option: {grid_config.on_target}')
+
+
+def _make_pogema(grid_config):
+    env = _make_base_pogema(grid_config)
 
     env = MultiTimeLimit(env, grid_config.max_episode_steps)
     if env.grid_config.persistent:
@@ -0,0 +1,110 @@
+from typing import NamedTuple
+
+import numpy as np
+
+from pogema.collisions import resolve_priority, resolve_block_both, resolve_soft, find_occupants
+from pogema.grid_config import GridConfig
+
+COLLISION_RESOLVERS = {
+    'priority': resolve_priority,
+    'block_both': resolve_block_both,
+    'soft': resolve_soft,
+}
+
+
+class PogemaState(NamedTuple):
+    """
+    Dynamic state of the agents, arrays may have any number of leading batch dimensions.
+    """
+    agents_xy: np.ndarray  # int (..., num_agents, 2)
+    targets_xy: np.ndarray  # int (..., num_agents, 2)
+    active: np.ndarray  # bool (..., num_agents)
+
+
+def move_agents(state: PogemaState, actions, legal_moves, moves=None, collision_system='priority', occupancy=None):
+    """
+    Moves the agents according to the actions and the collision system without changing any of the inputs.
+    :param state: state of the agents with batch shape B, i.e. agents_xy of shape B + (num_agents, 2)
+    :param actions: int array of shape B + (num_agents,)
+    :param legal_moves: uint8 bitmask of the legal moves from each cell (see Grid.legal_moves), either of shape
+    (height, width) shared by the whole batch or of shape B + (height, width)
+    :param moves: list of moves, GridConfig.MOVES by default
+    :param collision_system: 'priority', 'block_both' or 'soft'
+    :param occupancy: optional map of the index of the active agent standing on each cell or -1 (see Grid.occupancy)
+    of the same shape as legal_moves, only speeds up the lookups
+    :return: new agents_xy
+    """
+    if collision_system not in COLLISION_RESOLVERS:
+        raise ValueError('Unknown collision system: {}'.format(collision_system))
+    if moves is None:
+        moves = GridConfig().MOVES
+    moves = np.array(moves, dtype=np.int64)
+
+    agents_xy = np.asarray(state.agents_xy)
+    batch_shape, num_agents = agents_xy.shape[:-2], agents_xy.shape[-2]
+    num_batches = int(np.prod(batch_shape, dtype=np.int64))
+    height, width = legal_moves.shape[-2:]
+    shared_map = legal_moves.ndim == 2
+
+    agents_xy = agents_xy.reshape(num_batches, num_agents, 2).astype(np.int64)
+    actions = np.asarray(actions).reshape(num_batches, num_agents)
+    active = np.asarray(state.active).reshape(-1)
+
+    # flat cell indices, every batch element gets its own copy of the map, so they never interact
+    local_cells = agents_xy[..., 0] * width + agents_xy[..., 1]
+    map_offsets = np.arange(num_batches, dtype=np.int64)[:, None] * (height * width)
+    cells = (local_cells + map_offsets).ravel()
+    desired = cells + (moves[:, 0] * width + moves[:, 1])[actions.ravel()]
+
+    legal_cells = local_cells.ravel() if shared_map else cells
+    legal = (legal_moves.reshape(-1)[legal_cells] >> actions.ravel().astype(np.uint8)) & 1 == 1
+
+    if occupancy is not None and not shared_map:
+        occupants = occupancy.reshape(-1)[desired].astype(np.int64)
+        agent_offsets = np.repeat(np.arange(num_batches, dtype=np.int64) * num_agents, num_agents)
+        occupants = np.where(occupants >= 0, occupants + agent_offsets, -1)
+    elif occupancy is not None and num_batches == 1:
+        occupants = occupancy.reshape(-1)[desired].astype(np.int64)
+    else:
+        occupants = find_occupants(cells, active, desired)
+
+    new_cells = COLLISION_RESOLVERS[collision_system](cells, desired, active, legal, occupants)
+    new_cells = new_cells.reshape(num_batches, num_agents) - map_offsets
+    new_xy = np.stack(np.divmod(new_cells, width), axis=-1)
+    return new_xy.reshape(batch_shape + (num_agents, 2)).astype(state.agents_xy.dtype)
+
+
+def apply_on_target(state: PogemaState, on_target='finish'):
+    """
+    Computes the rewards and the termination flags of the agents after the move.
+    'finish' - agents reaching their targets get the reward, terminate and become inactive;
+    'nothing' - all agents get the reward and terminate once all active agents are on their targets;
+    'restart' - agents reaching their targets get the reward, new targets are sampled by the environment.
+    :return: state with the updated active flags, float32 rewards and bool terminated arrays of shape of active
+    """
+    on_goal = (np.asarray(state.agents_xy) == np.asarray(state.targets_xy)).all(axis=-1)
+    reached = on_goal & state.active
+    if on_target == 'finish':
+        return state._replace(active=state.active & ~reached), reached.astype(np.float32), on_goal
+    elif on_target == 'restart':
+        return state, reached.astype(np.float32), np.zeros_like(on_goal)
+    elif on_target == 'nothing':
+        terminated = np.broadcast_to(reached.all(axis=-1, keepdims=True), reached.shape).copy()
+        return state, terminated.astype(np.float32), terminated
+    raise KeyError(f'Unknown on_target option: {on_target}')
+
+
+def step(state: PogemaState, actions, legal_moves, moves=None, collision_system='priority', on_target='finish'):
+    """
+    Side-effect-free step of the environment over the agents state arrays, which may have a leading batch dimension,
+    e.g. to evaluate many hypothetical joint actions from the same state at once:
+
+        batch = PogemaState(*(np.repeat(array[None], num_candidates, axis=0) for array in state))
+        new_state, rewards, terminated = step(batch, candidate_actions, grid.legal_moves)
+
+    Lifelong target resampling needs the random generators of the environment, so for on_target='restart' the
+    targets are left unchanged.
+    :return: new state, rewards and terminated arrays of shape (..., num_agents)
+    """
+    new_xy = move_agents(state, actions, legal_moves, moves, collision_system)
+    return apply_on_target(state._replace(agents_xy=new_xy), on_target)
@@ -1,9 +1,9 @@
-import time
-from collections import defaultdict
+from typing import NamedTuple
 
 import numpy as np
 
 from pogema import GridConfig
+from pogema.utils import union_find
 
 
 def generate_obstacles(grid_config: GridConfig, rnd=None):
@@ -12,96 +12,82 @@ def generate_obstacles(grid_config: GridConfig, rnd=None):
     return rnd.binomial(1, grid_config.density, (grid_config.size, grid_config.size))
 
 
-def bfs(grid, moves, size, start_id, free_cell):
-    q = []
-    current_id = start_id
-
-    components = [0 for _ in range(start_id)]
-
-    size_x = len(grid)
-    size_y = len(grid[0])
-
-    for x in range(size_x):
-        for y in range(size_y):
-            if grid[x, y] != free_cell:
-                continue
-
-            grid[x, y] = current_id
-            components.append(1)
-            q.append((x, y))
-
-            while len(q):
-                cx, cy = q.pop(0)
-
-                for dx, dy in moves:
-                    nx, ny = cx + dx, cy + dy
-                    if 0 <= nx < size_x and 0 <= ny < size_y:
-                        if grid[nx, ny] == free_cell:
-                            grid[nx, ny] = current_id
-                            components[current_id] += 1
-                            q.append((nx, ny))
-
-            current_id += 1
-    return components
-
-
-def placing_fast(order, components, grid, start_id, num_agents):
-    link_to_next = [-1 for _ in range(len(order))]
-    colors = [-1 for _ in range(len(components))]
-    size = len(order)
-    for index in range(size):
-        reversed_index = len(order) - index - 1
-        color = grid[order[reversed_index]]
-        link_to_next[reversed_index] = colors[color]
-        colors[color] = reversed_index
-
-    positions_xy = []
-    finishes_xy = []
-
-    for index in range(len(order)):
-        next_index = link_to_next[index]
-        if next_index == -1:
-            continue
-
-        positions_xy.append(order[index])
-        finishes_xy.append(order[next_index])
-
-        link_to_next[next_index] = -1
-        if len(finishes_xy) >= num_agents:
-            break
-    return positions_xy, finishes_xy
-
-
-def placing(order, components, grid, start_id, num_agents):
-    requests = [[] for _ in range(len(components))]
-
-    done_requests = 0
-    positions_xy = []
-    finishes_xy = [(-1, -1) for _ in range(num_agents)]
-    for x, y in order:
-        if grid[x, y] < start_id:
-            continue
-
-        id_ = grid[x, y]
-        grid[x, y] = 0
-
-        if requests[id_]:
-            tt = requests[id_].pop()
-            finishes_xy[tt] = x, y
-            done_requests += 1
-            continue
-
-        if len(positions_xy) >= num_agents:
-            if done_requests >= num_agents:
-                break
-            continue
+def generate_warehouse(grid_config: GridConfig, shelf_length=8, shelf_depth=2, aisle_width=1, cross_aisle_width=1,
+                       margin=1, stock_density=1.0, obstacle_density=0.0, rnd=None):
+    """
+    Generates a warehouse of grid_config.size: blocks of shelves with stocks separated by aisles, cross aisles with
+    left/right direction and a ring road of width margin around (left/right on the top and the bottom, up/down on
+    the sides). The aisles, the intersections and the corners of the ring allow all directions, so every free cell
+    is reachable from the roads. The layers can be passed to GridConfig as map=(obstacles, stocks, directions).
+    :param grid_config: size, seed, FREE and OBSTACLE are used
+    :param shelf_length: rows of a block of shelves
+    :param shelf_depth: columns of a block of shelves
+    :param aisle_width: columns between the blocks
+    :param cross_aisle_width: rows between the blocks
+    :param margin: width of the ring road
+    :param stock_density: probability of a shelf cell which isn't an obstacle to hold a stock
+    :param obstacle_density: probability of a shelf cell to be an obstacle (e.g. a pillar)
+    :param rnd: numpy Generator, created from the seed if not set
+    :return: int32 obstacles, stocks and directions arrays
+    """
+    c = grid_config
+    if rnd is None:
+        rnd = np.random.default_rng(c.seed)
+    size = c.size
+    rows, cols = np.arange(size)[:, None], np.arange(size)[None, :]
+
+    ring_rows = (rows < margin) | (rows >= size - margin)
+    ring_cols = (cols < margin) | (cols >= size - margin)
+    inner = ~ring_rows & ~ring_cols
+    shelf_rows = (rows - margin) % (shelf_length + cross_aisle_width) < shelf_length
+    shelf_cols = (cols - margin) % (shelf_depth + aisle_width) < shelf_depth
+    shelves = inner & shelf_rows & shelf_cols
+    cross_aisles = inner & ~shelf_rows
+
+    directions = np.zeros((size, size), dtype=np.int32)  # 0: 四个方向都可以走
+    directions[(cross_aisles & shelf_cols) | (ring_rows & ~ring_cols & shelf_cols)] = 1  # 1: 左右方向
+    directions[ring_cols & ~ring_rows & shelf_rows] = 2  # 2: 上下方向
+
+    # a single draw per cell: [0, obstacle_density) is an obstacle, the next stock_density share of the rest is a stock
+    draws = rnd.random((size, size))
+    is_obstacle = shelves & (draws < obstacle_density)
+    is_stock = shelves & ~is_obstacle & (draws < obstacle_density + stock_density * (1 - obstacle_density))
+    obstacles = np.where(is_obstacle, c.OBSTACLE, c.FREE).astype(np.int32)
+    stocks = np.where(is_stock, c.OBSTACLE, c.FREE).astype(np.int32)
+    return obstacles, stocks, directions
+
+
+def connected_components(grid, free_cell=0):
+    """
+    Labels the 4-connected components of the free cells in linear time: the rows are split into runs of free cells,
+    the runs touching each other vertically are merged with union-find over arrays.
+    The components are numbered in the order of their first cell in the row-major scan.
+    :param grid: 2d array
+    :param free_cell: value of the free cells
+    :return: int32 array of the component index of each cell (-1 for not free cells) and int64 array of the sizes
+    """
+    free = np.asarray(grid) == free_cell
+    height, width = free.shape
+    labels = np.full((height, width), -1, dtype=np.int32)
+    if not free.any():
+        return labels, np.zeros(0, dtype=np.int64)
+
+    # runs of consecutive free cells in the rows
+    run_starts = free.copy()
+    run_starts[:, 1:] &= ~free[:, :-1]
+    run_ids = np.cumsum(run_starts.ravel(), dtype=np.int32).reshape(height, width) - 1
+    num_runs = int(run_ids[-1, -1]) + 1
+
+    # the runs are connected if they have vertically adjacent free cells
+    vertical = free[:-1] & free[1:]
+    upper, lower = run_ids[:-1][vertical], run_ids[1:][vertical]
+    linked = np.flatnonzero(np.diff(upper, prepend=-1) | np.diff(lower, prepend=-1))
+
+    # components are numbered by their lowest run, so the numbering follows the row-major scan
+    run_components, num_components = union_find(num_runs, upper[linked], lower[linked])
+    labels[free] = run_components[run_ids[free]]
+    return labels, np.bincount(labels[free], minlength=num_components).astype(np.int64)
 
-        if components[id_] >= 2:
-            components[id_] -= 2
-            requests[id_].append(len(positions_xy))
-            positions_xy.append((x, y))
-
-    return positions_xy, finishes_xy
 
 def generate_from_possible_positions(grid_config: GridConfig):
     if len(grid_config.possible_agents_xy) < grid_config.num_agents or len(grid_config.possible_targets_xy) < grid_config.num_agents:
@@ -112,68 +98,162 @@ def generate_from_possible_positions(grid_config: GridConfig):
     return grid_config.possible_agents_xy[:grid_config.num_agents], grid_config.possible_targets_xy[:grid_config.num_agents]
     
 
-def generate_positions_and_targets_fast(obstacles, grid_config):
+def placing_flat(order, components, sizes, num_agents):
+    """
+    Places the agents within the components over flat arrays. Walking the cells in the given order, the cells of every
+    component are paired consecutively: the first cell of each pair is a start of an agent and the second one is its target.
+    The agents are numbered by the order of their starts, so the first num_agents pairs are taken.
+    :param order: cells in the placement order (e.g. flat indices of the shuffled free cells)
+    :param components: component id of each cell of the order
+    :param sizes: sizes of the components
+    :param num_agents: number of agents to place
+    :return: starts and targets of the placed agents, taken from order
+    """
+    # stable sort keeps the placement order inside the components
+    by_component = np.argsort(components, kind='stable')
+    sorted_components = components[by_component]
+    offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    rank = np.arange(len(order)) - offsets[sorted_components]
+    # the last cell of a component of odd size gets no pair
+    is_start = (rank % 2 == 0) & (rank + 1 < sizes[sorted_components])
+
+    starts = by_component[is_start]
+    targets = by_component[np.flatnonzero(is_start) + 1]
+    agents = np.argsort(starts, kind='stable')[:num_agents]
+    return order[starts[agents]], order[targets[agents]]
+
+
+def label_components(obstacles, grid_config):
+    """
+    Labels the connected components of the free cells, the labels depend only on the obstacles, so they can be reused
+    to place the agents many times on the same map.
+    :return: int32 component ids of the cells (-1 for not free cells) and sizes of the components
+    """
+    return connected_components(obstacles, free_cell=grid_config.FREE)
+
+
+def generate_positions_and_targets_fast(obstacles, grid_config, labels=None):
+    """
+    Places the agents and their targets in the same components of the free cells, reproducibly for the config seed.
+    :param obstacles: 2d array
+    :param grid_config:
+    :param labels: precomputed label_components of the obstacles
+    :return: list of the starts and list of num_agents targets, (-1, -1) for the agents which couldn't be placed
+    """
     c = grid_config
-    grid = obstacles.copy()
-
-    start_id = max(c.FREE, c.OBSTACLE) + 1
+    if labels is None:
+        labels = label_components(obstacles, grid_config)
+    labels, sizes = labels
 
-    components = bfs(grid, tuple(c.MOVES), c.size, start_id, free_cell=c.FREE)
-    height, width = obstacles.shape
-    order = [(x, y) for x in range(height) for y in range(width) if grid[x, y] >= start_id]
+    width = obstacles.shape[1]
+    order = np.flatnonzero(labels.ravel() >= 0)
     np.random.default_rng(c.seed).shuffle(order)
 
-    return placing(order=order, components=components, grid=grid, start_id=start_id, num_agents=c.num_agents)
-
-def generate_from_possible_targets(rnd_generator, possible_positions, position):
-    new_target = tuple(rnd_generator.choice(possible_positions, 1)[0])
-    while new_target == position:
-        new_target = tuple(rnd_generator.choice(possible_positions, 1)[0])
-    return new_target
-
-def generate_new_target(rnd_generator, point_to_component, component_to_points, position):
-    component_id = point_to_component[position]
-    component = component_to_points[component_id]
-    new_target = tuple(*rnd_generator.choice(component, 1))
-    while new_target == position:
-        new_target = tuple(*rnd_generator.choice(component, 1))
-    return new_target
-
-
-def get_components(grid_config, obstacles, positions_xy, target_xy):
-    c = grid_config
-    grid = obstacles.copy()
-
-    start_id = max(c.FREE, c.OBSTACLE) + 1
-    bfs(grid, tuple(c.MOVES), c.size, start_id, free_cell=c.FREE)
-    height, width = obstacles.shape
-
-    comp_to_points = defaultdict(list)
-    point_to_comp = {}
-    for x in range(height):
-        for y in range(width):
-            comp_to_points[grid[x, y]].append((x, y))
-            point_to_comp[(x, y)] = grid[x, y]
-    return comp_to_points, point_to_comp
-
+    starts, targets = placing_flat(order, labels.ravel()[order], sizes, c.num_agents)
+    positions_xy = list(zip((starts // width).tolist(), (starts % width).tolist()))
+    finishes_xy = list(zip((targets // width).tolist(), (targets % width).tolist()))
+    finishes_xy += [(-1, -1)] * (c.num_agents - len(finishes_xy))
+    return positions_xy, finishes_xy
 
-def time_it(func, num_iterations):
-    start = time.monotonic()
-    for index in range(num_iterations):
-        grid_config = GridConfig(num_agents=64, size=64, seed=index)
-        obstacles = generate_obstacles(grid_config)
-        result = func(obstacles, grid_config, )
-        if index == 0 and num_iterations > 1:
-            print(result)
-    finish = time.monotonic()
 
-    return finish - start
+class ComponentIndex(NamedTuple):
+    """
+    Compact index of the connected components of the free cells in CSR layout: the flat indices (x * width + y) of
+    the cells of component i are flat_cell_indices[offsets[i]:offsets[i + 1]] in the row-major order.
+    """
+    labels: np.ndarray  # int32 (height, width), -1 for not free cells
+    offsets: np.ndarray  # int64 (num_components + 1,)
+    flat_cell_indices: np.ndarray  # int64 (number of free cells,)
+
+    def get_component(self, xy):
+        return int(self.labels[xy[0], xy[1]])
+
+
+def build_component_index(obstacles, free_cell=0):
+    """
+    Builds the ComponentIndex of the free cells of the map.
+    :param obstacles: 2d array
+    :param free_cell: value of the free cells
+    :return: ComponentIndex
+    """
+    labels, sizes = connected_components(obstacles, free_cell)
+    flat_labels = labels.ravel()
+    # stable sort keeps the cells of every component in the row-major order, not free cells (-1) go first
+    flat_cell_indices = np.argsort(flat_labels, kind='stable')[len(flat_labels) - int(sizes.sum()):]
+    offsets = np.zeros(len(sizes) + 1, dtype=np.int64)
+    np.cumsum(sizes, out=offsets[1:])
+    return ComponentIndex(labels=labels, offsets=offsets, flat_cell_indices=flat_cell_indices.astype(np.int64))
+
+
+_GOLDEN_GAMMA = np.uint64(0x9e3779b97f4a7c15)
+
+
+def _mix64(x):
+    # splitmix64 finalizer, uint64 arrays wrap around on overflow
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xbf58476d1ce4e5b9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94d049bb133111eb)
+    return x ^ (x >> np.uint64(31))
+
+
+def counter_random(key, agent_ids, goal_indices, attempt=0):
+    """
+    Counter-based random numbers: every number is a hash of (key, agent, goal index, attempt), so the draws of an
+    agent don't depend on the other agents or on the order of the draws, and no generator state is kept.
+    :param key: seed of the stream
+    :param agent_ids: int array
+    :param goal_indices: int array of the same shape as agent_ids
+    :param attempt: index of the draw for the same goal
+    :return: uint64 array of the shape of agent_ids
+    """
+    with np.errstate(over='ignore'):
+        x = _mix64(np.asarray(agent_ids, dtype=np.uint64) * _GOLDEN_GAMMA + np.uint64(key))
+        x = _mix64(x ^ (np.asarray(goal_indices, dtype=np.uint64) * _GOLDEN_GAMMA + np.uint64(attempt)))
+    return x
+
+
+def sample_cells(key, agent_ids, goal_indices, cells, starts, sizes, excluded):
+    """
+    Samples cells[starts[i]:starts[i] + sizes[i]] uniformly for every agent i other than excluded[i] in one batched
+    draw, the agents with a single candidate get it.
+    :return: int64 array of the sampled cells
+    """
+    agent_ids, goal_indices = np.asarray(agent_ids), np.asarray(goal_indices)
+    sampled = cells[starts].astype(np.int64)
+    pending = np.flatnonzero(sizes >= 2)
+    attempt = 0
+    while len(pending):
+        draws = counter_random(key, agent_ids[pending], goal_indices[pending], attempt)
+        sampled[pending] = cells[starts[pending] + (draws % sizes[pending].astype(np.uint64)).astype(np.int64)]
+        pending = pending[sampled[pending] == excluded[pending]]
+        attempt += 1
+    return sampled
+
+
+def generate_new_targets(key, agent_ids, goal_indices, component_index: ComponentIndex, positions_xy):
+    """
+    Samples the new targets of the agents uniformly from the components of their positions, other than the positions
+    themselves. The targets depend only on (key, agent, goal index) and the position.
+    :param key: seed of the stream
+    :param agent_ids: int array of the agents
+    :param goal_indices: int array of the number of the goals each agent has already got
+    :param component_index: ComponentIndex of the map
+    :param positions_xy: int array of shape (len(agent_ids), 2)
+    :return: int array of shape (len(agent_ids), 2) of the new targets
+    """
+    labels, offsets = component_index.labels, component_index.offsets
+    width = labels.shape[1]
+    positions_xy = np.asarray(positions_xy).reshape(-1, 2)
+    positions = positions_xy[:, 0].astype(np.int64) * width + positions_xy[:, 1]
+    components = labels.ravel()[positions]
+    starts, sizes = offsets[components], offsets[components + 1] - offsets[components]
+    targets = sample_cells(key, agent_ids, goal_indices, component_index.flat_cell_indices, starts, sizes, positions)
+    return np.stack(np.divmod(targets, width), axis=-1)
 
 
 def main():
-    num_iterations = 1000
-    time_it(generate_positions_and_targets_fast, num_iterations=1)
-    print('fast:', time_it(generate_positions_and_targets_fast, num_iterations=num_iterations))
+    from pogema.benchmark import main as benchmark_main
+
+    benchmark_main(['--benchmarks', 'generate_obstacles', 'label_components', 'placement'])
 
 
 if __name__ == '__main__':
@@ -4,10 +4,86 @@ import warnings
 import numpy as np
 
 from pogema.generator import generate_obstacles, generate_positions_and_targets_fast, \
-    get_components, generate_from_possible_positions
+    build_component_index, generate_from_possible_positions, label_components
+from .functional import PogemaState
 from .grid_config import GridConfig
 from .grid_registry import in_registry, get_grid
-from .utils import render_grid
+from .instance_cache import load_instance
+from .utils import render_grid, get_legal_moves_mask, get_unreachable_targets, get_direction_moves_table, \
+    VEHICLE_CAN_PASS_STOCKS
+
+
+class AgentsXYView:
+    """
+    List-like view over an (N, 2) int32 coordinates array. Items are (x, y) tuples of python ints,
+    assignments are written straight into the underlying array.
+    """
+
+    def __init__(self, array):
+        self._array = array
+
+    def __len__(self):
+        return len(self._array)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [tuple(xy) for xy in self._array[idx].tolist()]
+        x, y = self._array[idx].tolist()
+        return x, y
+
+    def __setitem__(self, idx, value):
+        self._array[idx] = value
+
+    def __iter__(self):
+        return (tuple(xy) for xy in self._array.tolist())
+
+    def __array__(self, dtype=None):
+        return self._array if dtype is None else self._array.astype(dtype)
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __deepcopy__(self, memo):
+        return list(self)
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class ActiveFlagsView:
+    """
+    Dict-like view over an (N,) bool array of agents activity flags, keyed by agent id.
+    """
+
+    def __init__(self, array):
+        self._array = array
+
+    def __len__(self):
+        return len(self._array)
+
+    def __getitem__(self, agent_id):
+        return bool(self._array[agent_id])
+
+    def __setitem__(self, agent_id, value):
+        self._array[agent_id] = value
+
+    def __iter__(self):
+        return iter(range(len(self._array)))
+
+    def __array__(self, dtype=None):
+        return self._array if dtype is None else self._array.astype(dtype)
+
+    def keys(self):
+        return range(len(self._array))
+
+    def values(self):
+        return self._array.tolist()
+
+    def items(self):
+        return enumerate(self._array.tolist())
+
+    def __repr__(self):
+        return repr(dict(self.items()))
 
 
 class Grid:
@@ -16,14 +92,15 @@ class Grid:
 
         self.config = grid_config
         self.rnd = np.random.default_rng(grid_config.seed)
+        # component labels of the map without borders, reused by reset_agents
+        self._labels = None
         if self.config.map is None:
             self.obstacles = generate_obstacles(self.config)
             self.stocks = np.zeros_like(self.obstacles, dtype=np.int32)
             self.directions = np.zeros_like(self.obstacles, dtype=np.int32)  # 默认全方向
         else:
-            self.obstacles = np.array([np.array(line) for line in self.config.map])[0]
-            self.stocks = np.array([np.array(line) for line in self.config.map])[1]
-            self.directions = np.array([np.array(line) for line in self.config.map])[2]
+            # the parsed layers are shared between configs, they are copied by astype below
+            self.obstacles, self.stocks, self.directions = self.config.map
         if in_registry(self.config.map_name):
             self.obstacles = get_grid(self.config.map_name).get_obstacles()
             self.stocks = np.zeros_like(self.obstacles, dtype=np.int32)
@@ -32,7 +109,16 @@ class Grid:
         self.stocks = self.stocks.astype(np.int32)
         self.directions = self.directions.astype(np.int32)
 
-        if grid_config.targets_xy and grid_config.agents_xy:
+        instance = None
+        if grid_config.instance_cache_dir is not None:
+            instance = load_instance(grid_config.instance_cache_dir, grid_config)
+
+        if instance is not None:
+            # pregenerated by generate_instances
+            self.obstacles = instance.obstacles.astype(np.int32)
+            self.starts_xy = [tuple(xy) for xy in instance.starts_xy.tolist()]
+            self.finishes_xy = [tuple(xy) for xy in instance.targets_xy.tolist()]
+        elif grid_config.targets_xy and grid_config.agents_xy:
             self.starts_xy, self.finishes_xy = grid_config.agents_xy, grid_config.targets_xy
             if len(self.starts_xy) != len(self.finishes_xy):
                 raise IndexError("Can't create task. Please provide agents_xy and targets_xy of the same size.")
@@ -51,10 +137,17 @@ class Grid:
                     warnings.warn(f"There is an obstacle on a finish point ({s_x}, {s_y}), replacing with free cell",
                                   Warning, stacklevel=2)
                 self.obstacles[f_x, f_y] = grid_config.FREE
+            unreachable = get_unreachable_targets(self.obstacles, self.starts_xy, self.finishes_xy, self.directions,
+                                                  self.config.MOVES)
+            if len(unreachable):
+                warnings.warn(f"Targets of the agents {unreachable.tolist()} are unreachable from their start points",
+                              Warning, stacklevel=2)
         elif grid_config.possible_agents_xy and grid_config.possible_targets_xy:
             self.starts_xy, self.finishes_xy = generate_from_possible_positions(self.config)
         else:
-            self.starts_xy, self.finishes_xy = generate_positions_and_targets_fast(self.obstacles, self.config)
+            self._labels = label_components(self.obstacles, self.config)
+            self.starts_xy, self.finishes_xy = generate_positions_and_targets_fast(self.obstacles, self.config,
+                                                                                   self._labels)
 
         if len(self.starts_xy) != len(self.finishes_xy):
             for attempt in range(num_retries):
@@ -63,23 +156,109 @@ class Grid:
                     break
                 if self.config.map is None:
                     self.obstacles = generate_obstacles(self.config)
-                self.starts_xy, self.finishes_xy = generate_positions_and_targets_fast(self.obstacles, self.config)
+                    self._labels = label_components(self.obstacles, self.config)
+                self.starts_xy, self.finishes_xy = generate_positions_and_targets_fast(self.obstacles, self.config,
+                                                                                       self._labels)
 
         if not self.starts_xy or not self.finishes_xy or len(self.starts_xy) != len(self.finishes_xy):
             raise OverflowError(
                 "Can't create task. Please check grid grid_config, especially density, num_agent and map.")
 
+        self._border = 0
         if add_artificial_border:
             self.add_artificial_border()
+            self._border = self.config.obs_radius
+
+        # agents state is stored as arrays, positions_xy/finishes_xy/is_active are thin views over them
+        self.agents_xy = np.array(self.starts_xy, dtype=np.int32).reshape(-1, 2)
+        self.active = np.ones(len(self.agents_xy), dtype=bool)
+        self._initial_xy = self.agents_xy.copy()
+
+        self.positions = np.zeros(self.obstacles.shape)
+        # index of the active agent standing on each cell, -1 for empty cells
+        self.occupancy = np.full(self.obstacles.shape, -1, dtype=np.int32)
+        self._place_agents()
+
+        # bitmask of the legal moves from each cell, stocks don't block agents in the environment
+        self.legal_moves = get_legal_moves_mask(self.obstacles != self.config.FREE, self.directions, self.config.MOVES)
+        self._legal_moves_by_vehicle = {}
+        self._direction_moves = get_direction_moves_table(self.config.MOVES)
+
+    def _place_agents(self):
+        self.positions[self.agents_xy[:, 0], self.agents_xy[:, 1]] = self.config.OBSTACLE
+        self.occupancy[self.agents_xy[:, 0], self.agents_xy[:, 1]] = np.arange(len(self.agents_xy), dtype=np.int32)
+
+    def reset_agents(self, seed=None):
+        """
+        Re-samples the agents and their targets on the same map. The static layers (obstacles, stocks, directions,
+        legal moves and component labels) are kept and all arrays are updated in place.
+        :param seed: seed of the new placement, the config seed is used if it's not set
+        :return:
+        """
+        config = self.config if seed is None else self.config.copy(update=dict(seed=seed))
+        if config.targets_xy and config.agents_xy:
+            starts_xy, finishes_xy = config.agents_xy[:config.num_agents], config.targets_xy[:config.num_agents]
+        elif config.possible_agents_xy and config.possible_targets_xy:
+            starts_xy, finishes_xy = generate_from_possible_positions(config)
+        else:
+            height, width = self.obstacles.shape
+            obstacles = self.obstacles[self._border:height - self._border, self._border:width - self._border]
+            if self._labels is None:
+                self._labels = label_components(obstacles, config)
+            starts_xy, finishes_xy = generate_positions_and_targets_fast(obstacles, config, self._labels)
+
+        if not starts_xy or len(starts_xy) != len(finishes_xy) or len(starts_xy) != len(self.agents_xy):
+            raise OverflowError(
+                "Can't create task. Please check grid grid_config, especially density, num_agent and map.")
+
+        self.starts_xy = [(x + self._border, y + self._border) for x, y in starts_xy]
+        self.agents_xy[...] = self.starts_xy
+        self.targets_xy[...] = [(x + self._border, y + self._border) for x, y in finishes_xy]
+        self.active[...] = True
+        self._initial_xy[...] = self.agents_xy
+
+        self.positions[...] = self.config.FREE
+        self.occupancy[...] = -1
+        self._place_agents()
+
+    def restore_agents(self, agents_xy, targets_xy, active, initial_xy=None):
+        """
+        Sets the agents state in place, updating only the cells of the previous and the new active agents
+        in the positions and occupancy maps.
+        """
+        previous = self.agents_xy[self.active]
+        self.positions[previous[:, 0], previous[:, 1]] = self.config.FREE
+        self.occupancy[previous[:, 0], previous[:, 1]] = -1
 
-        filled_positions = np.zeros(self.obstacles.shape)
-        for x, y in self.starts_xy:
-            filled_positions[x, y] = 1
+        self.agents_xy[...] = agents_xy
+        self.targets_xy[...] = targets_xy
+        self.active[...] = active
+        if initial_xy is not None:
+            self._initial_xy[...] = initial_xy
 
-        self.positions = filled_positions
-        self.positions_xy = self.starts_xy
-        self._initial_xy = deepcopy(self.starts_xy)
-        self.is_active = {agent_id: True for agent_id in range(self.config.num_agents)}
+        agent_ids = np.flatnonzero(self.active)
+        self.positions[self.agents_xy[agent_ids, 0], self.agents_xy[agent_ids, 1]] = self.config.OBSTACLE
+        self.occupancy[self.agents_xy[agent_ids, 0], self.agents_xy[agent_ids, 1]] = agent_ids
+
+    @property
+    def positions_xy(self):
+        return AgentsXYView(self.agents_xy)
+
+    @positions_xy.setter
+    def positions_xy(self, value):
+        self.agents_xy = np.array(value, dtype=np.int32).reshape(-1, 2)
+
+    @property
+    def finishes_xy(self):
+        return AgentsXYView(self.targets_xy)
+
+    @finishes_xy.setter
+    def finishes_xy(self, value):
+        self.targets_xy = np.array(value, dtype=np.int32).reshape(-1, 2)
+
+    @property
+    def is_active(self):
+        return ActiveFlagsView(self.active)
 
     def add_artificial_border(self):
         gc = self.config
@@ -114,6 +293,20 @@ class Grid:
         self.starts_xy = [(x + r, y + r) for x, y in self.starts_xy]
         self.finishes_xy = [(x + r, y + r) for x, y in self.finishes_xy]
 
+    def get_legal_moves(self, vehicle_type=None):
+        """
+        Returns uint8 bitmask of the legal moves from each cell, bit i is set if GridConfig.MOVES[i] is allowed.
+        :param vehicle_type: if set, the cells with stocks are blocked for the vehicles that can't pass them
+        :return:
+        """
+        if vehicle_type is None or VEHICLE_CAN_PASS_STOCKS.get(vehicle_type, False):
+            return self.legal_moves
+        if vehicle_type not in self._legal_moves_by_vehicle:
+            blocked = (self.obstacles != self.config.FREE) | (self.stocks != self.config.FREE)
+            self._legal_moves_by_vehicle[vehicle_type] = get_legal_moves_mask(blocked, self.directions,
+                                                                              self.config.MOVES)
+        return self._legal_moves_by_vehicle[vehicle_type]
+
     def get_obstacles(self, ignore_borders=False):
         gc = self.config
         if ignore_borders:
@@ -143,7 +336,7 @@ class Grid:
 
     @staticmethod
     def _filter_inactive(pos, active_flags):
-        return [pos for idx, pos in enumerate(pos) if active_flags[idx]]
+        return [pos for pos, active in zip(pos, active_flags) if active]
 
     def get_grid_config(self):
         return deepcopy(self.config)
@@ -155,7 +348,7 @@ class Grid:
         gc = self.config
 
         if only_active:
-            positions = self._filter_inactive(positions, [idx for idx, active in self.is_active.items() if active])
+            positions = self._filter_inactive(positions, self.active.tolist())
 
         if ignore_borders:
             positions = self._cut_borders_xy(positions, gc.obs_radius)
@@ -163,16 +356,12 @@ class Grid:
         return positions
 
     def get_agents_xy(self, only_active=False, ignore_borders=False):
-        return self._prepare_positions(deepcopy(self.positions_xy), only_active, ignore_borders)
+        return self._prepare_positions(list(self.positions_xy), only_active, ignore_borders)
 
     @staticmethod
     def to_relative(coordinates, offset):
-        result = deepcopy(coordinates)
-        for idx, _ in enumerate(result):
-            x, y = result[idx]
-            dx, dy = offset[idx]
-            result[idx] = x - dx, y - dy
-        return result
+        relative = np.asarray(coordinates) - np.asarray(offset)
+        return [tuple(xy) for xy in relative.tolist()]
 
     def get_agents_xy_relative(self):
         return self.to_relative(self.positions_xy, self._initial_xy)
@@ -181,7 +370,7 @@ class Grid:
         return self.to_relative(self.finishes_xy, self._initial_xy)
 
     def get_targets_xy(self, only_active=False, ignore_borders=False):
-        return self._prepare_positions(deepcopy(self.finishes_xy), only_active, ignore_borders)
+        return self._prepare_positions(list(self.finishes_xy), only_active, ignore_borders)
 
     def _normalize_coordinates(self, coordinates):
         gc = self.config
@@ -235,6 +424,49 @@ class Grid:
         r = self.config.obs_radius
         return self.positions[x - r:x + r + 1, y - r:y + r + 1].astype(np.float32)
 
+    def _windows_for_agents(self, layer, out=None):
+        """
+        Gathers the (2r+1, 2r+1) windows of the padded layer around every agent at once.
+        :param layer: one of the padded grids (obstacles, stocks, directions, positions)
+        :param out: optional float32 array of shape (num_agents, 2r+1, 2r+1) to write into
+        :return: float32 array of shape (num_agents, 2r+1, 2r+1)
+        """
+        r = self.config.obs_radius
+        full_size = r * 2 + 1
+        height, width = layer.shape
+        stride_x, stride_y = layer.strides
+        windows = np.lib.stride_tricks.as_strided(layer, shape=(height - full_size + 1, width - full_size + 1,
+                                                                full_size, full_size),
+                                                  strides=(stride_x, stride_y, stride_x, stride_y), writeable=False)
+        gathered = windows[self.agents_xy[:, 0] - r, self.agents_xy[:, 1] - r]
+        if out is None:
+            return gathered.astype(np.float32)
+        out[...] = gathered
+        return out
+
+    def get_obstacles_for_agents(self, out=None):
+        return self._windows_for_agents(self.obstacles, out)
+
+    def get_stocks_for_agents(self, out=None):
+        return self._windows_for_agents(self.stocks, out)
+
+    def get_directions_for_agents(self, out=None):
+        return self._windows_for_agents(self.directions, out)
+
+    def get_positions_for_agents(self, out=None):
+        return self._windows_for_agents(self.positions, out)
+
+    def get_square_targets(self, out=None):
+        r = self.config.obs_radius
+        full_size = r * 2 + 1
+        if out is None:
+            out = np.zeros((len(self.agents_xy), full_size, full_size), dtype=np.float32)
+        else:
+            out[...] = 0.0
+        dx, dy = np.clip(self.agents_xy - self.targets_xy, -r, r).T
+        out[np.arange(len(out)), r - dx, r - dy] = 1.0
+        return out
+
     def get_target(self, agent_id):
 
         x, y = self.positions_xy[agent_id]
@@ -265,19 +497,31 @@ class Grid:
         if self.positions[self.positions_xy[agent_id]] == self.config.FREE:
             raise KeyError("Agent {} is not in the map".format(agent_id))
         self.positions[self.positions_xy[agent_id]] = self.config.FREE
+        self.occupancy[self.positions_xy[agent_id]] = -1
         if self.obstacles[x, y] != self.config.FREE or self.positions[x, y] != self.config.FREE:
             raise ValueError(f"Can't force agent to blocked position {x} {y}")
         self.positions_xy[agent_id] = x, y
-        self.positions[self.positions_xy[agent_id]] = self.config.OBSTACLE
+        self.positions[x, y] = self.config.OBSTACLE
+        self.occupancy[x, y] = agent_id
 
     def has_obstacle(self, x, y):
         return self.obstacles[x, y] == self.config.OBSTACLE
 
+    def get_agent_at(self, x, y):
+        """
+        Returns the index of the active agent standing on the cell or -1 if the cell is empty.
+        """
+        return int(self.occupancy[x, y])
+
     def move_without_checks(self, agent_id, action):
         x, y = self.positions_xy[agent_id]
         dx, dy = self.config.MOVES[action]
-        self.positions[x, y] = self.config.FREE
+        # the cell might be already taken by an agent that moved in before
+        if self.occupancy[x, y] == agent_id:
+            self.positions[x, y] = self.config.FREE
+            self.occupancy[x, y] = -1
         self.positions[x+dx, y+dy] = self.config.OBSTACLE
+        self.occupancy[x+dx, y+dy] = agent_id
         self.positions_xy[agent_id] = (x+dx, y+dy)
 
     def move(self, agent_id, action):
@@ -286,34 +530,95 @@ class Grid:
         if self.obstacles[x + dx, y + dy] == self.config.FREE:
             if self.positions[x + dx, y + dy] == self.config.FREE:
                 self.positions[x, y] = self.config.FREE
+                self.occupancy[x, y] = -1
                 x += dx
                 y += dy
                 self.positions[x, y] = self.config.OBSTACLE
+                self.occupancy[x, y] = agent_id
         self.positions_xy[agent_id] = (x, y)
 
+    def get_agents_state(self):
+        """
+        Returns the agents state arrays (views, not copies) for the functions of pogema.functional.
+        """
+        return PogemaState(self.agents_xy, self.targets_xy, self.active)
+
+    def get_agents_cells(self):
+        """
+        Returns flat indices of the cells occupied by the agents.
+        """
+        return self.agents_xy[:, 0].astype(np.int64) * self.obstacles.shape[1] + self.agents_xy[:, 1]
+
+    def get_desired_cells(self, actions):
+        """
+        Returns flat indices of the agents' cells, the cells the agents try to move to according to the actions,
+        and whether those moves are legal (no obstacle in the target cell, allowed by the direction of the cell).
+        """
+        actions = np.asarray(actions)
+        moves = np.array(self.config.MOVES, dtype=np.int64)
+        cells = self.get_agents_cells()
+        desired = cells + (moves[:, 0] * self.obstacles.shape[1] + moves[:, 1])[actions]
+        legal = (self.legal_moves.ravel()[cells] >> actions.astype(np.uint8)) & 1 == 1
+        return cells, desired, legal
+
+    def get_action_masks(self):
+        """
+        Returns (num_agents, num_actions) bool array of the actions each agent can take right now: the move is legal
+        from the agent's cell and the target cell is not occupied by another agent. Inactive agents can only stay.
+        """
+        num_actions = len(self.config.MOVES)
+        moves = np.array(self.config.MOVES, dtype=np.int64)
+        cells = self.get_agents_cells()
+        masks = (self.legal_moves.ravel()[cells][:, None] >> np.arange(num_actions, dtype=np.uint8)) & 1 == 1
+        occupants = self.occupancy.ravel()[cells[:, None] + moves[:, 0] * self.obstacles.shape[1] + moves[:, 1]]
+        masks &= (occupants < 0) | (occupants == np.arange(len(cells))[:, None])
+        masks[~self.active] = np.arange(num_actions) == 0
+        return masks
+
+    def get_occupants(self, cells):
+        """
+        Returns the indices of the active agents standing on the given flat cells, -1 for empty cells.
+        """
+        return self.occupancy.ravel()[cells]
+
+    def move_agents_to_cells(self, cells):
+        """
+        Moves the agents to the given flat cell indices without any checks, keeping the positions and occupancy maps
+        in sync.
+        """
+        new_xy = np.stack(np.divmod(cells, self.obstacles.shape[1]), axis=-1).astype(np.int32)
+        moved = np.flatnonzero((new_xy != self.agents_xy).any(axis=1))
+        self.positions[self.agents_xy[moved, 0], self.agents_xy[moved, 1]] = self.config.FREE
+        self.occupancy[self.agents_xy[moved, 0], self.agents_xy[moved, 1]] = -1
+        self.positions[new_xy[moved, 0], new_xy[moved, 1]] = self.config.OBSTACLE
+        self.occupancy[new_xy[moved, 0], new_xy[moved, 1]] = moved
+        self.agents_xy[moved] = new_xy[moved]
+
     def on_goal(self, agent_id):
         return self.positions_xy[agent_id] == self.finishes_xy[agent_id]
 
-    def is_active(self, agent_id):
-        return self.is_active[agent_id]
+    def on_goal_mask(self):
+        return (self.agents_xy == self.targets_xy).all(axis=1)
 
     def hide_agent(self, agent_id):
-        if not self.is_active[agent_id]:
+        if not self.active[agent_id]:
             return False
-        self.is_active[agent_id] = False
+        self.active[agent_id] = False
 
         self.positions[self.positions_xy[agent_id]] = self.config.FREE
+        self.occupancy[self.positions_xy[agent_id]] = -1
 
         return True
 
     def show_agent(self, agent_id):
-        if self.is_active[agent_id]:
+        if self.active[agent_id]:
             return False
 
-        self.is_active[agent_id] = True
+        self.active[agent_id] = True
         if self.positions[self.positions_xy[agent_id]] == self.config.OBSTACLE:
             raise KeyError("The cell is already occupied")
         self.positions[self.positions_xy[agent_id]] = self.config.OBSTACLE
+        self.occupancy[self.positions_xy[agent_id]] = agent_id
         return True
 
     def is_move_valid(self, from_pos, to_pos):
@@ -323,27 +628,20 @@ class Grid:
         :param to_pos: 目标位置 [x, y]
         :return: 是否有效
         """
-        if not (0 <= from_pos[0] < self.directions.shape[0] and 
+        if not (0 <= from_pos[0] < self.directions.shape[0] and
                 0 <= from_pos[1] < self.directions.shape[1]):
             return False
-            
-        direction_type = self.directions[from_pos[0], from_pos[1]]
-        
-        dx = to_pos[0] - from_pos[0]
-        dy = to_pos[1] - from_pos[1]
-        
+
+        move = [to_pos[0] - from_pos[0], to_pos[1] - from_pos[1]]
+
         # 检查是否为相邻移动
-        if abs(dx) + abs(dy) != 1:
+        if abs(move[0]) + abs(move[1]) != 1 or move not in self.config.MOVES:
             return False
-            
-        if direction_type == 0:  # 全方向
-            return True
-        elif direction_type == 1:  # 左右
-            return dx == 0 and dy != 0
-        elif direction_type == 2:  # 上下
-            return dy == 0 and dx != 0
-        
-        return False
+
+        direction_type = self.directions[from_pos[0], from_pos[1]]
+        if not 0 <= direction_type < len(self._direction_moves):
+            return False
+        return bool(self._direction_moves[direction_type] >> self.config.MOVES.index(move) & 1)
 
 
 class GridLifeLong(Grid):
@@ -351,12 +649,18 @@ class GridLifeLong(Grid):
 
         super().__init__(grid_config, add_artificial_border, num_retries)
 
-        self.component_to_points, self.point_to_component = get_components(grid_config, self.obstacles,
-                                                                           self.positions_xy, self.finishes_xy)
+        self.component_index = build_component_index(self.obstacles, free_cell=grid_config.FREE)
+        self._check_components()
 
+    def reset_agents(self, seed=None):
+        # components depend only on the obstacles, so they are kept as well
+        super().reset_agents(seed)
+        self._check_components()
+
+    def _check_components(self):
         for i in range(len(self.positions_xy)):
             position, target = self.positions_xy[i], self.finishes_xy[i]
-            if self.point_to_component[position] != self.point_to_component[target]:
+            if self.component_index.get_component(position) != self.component_index.get_component(target):
                 warnings.warn(f"The start point ({position[0]}, {position[1]}) and the goal"
                               f" ({target[0]}, {target[1]}) are in different components. The goal is changed.",
-                              Warning, stacklevel=2)
+                              Warning, stacklevel=3)
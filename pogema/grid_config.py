@@ -1,5 +1,9 @@
+import hashlib
 import sys
-from typing import Optional, Union
+from collections import OrderedDict
+from typing import NamedTuple, Optional, Union
+
+import numpy as np
 from pydantic import validator
 
 from pogema.utils import CommonSettings
@@ -21,6 +25,9 @@ class GridConfig(CommonSettings, ):
     collision_system: Literal['block_both', 'priority', 'soft'] = 'priority'
     persistent: bool = False
     observation_type: Literal['POMAPF', 'MAPF', 'default'] = 'default'
+    reuse_obs_buffer: bool = False
+    fast_reset: bool = False
+    instance_cache_dir: Optional[str] = None
     map: Optional[Union[list, str]] = None
 
     map_name: Optional[str] = None
@@ -71,13 +78,21 @@ class GridConfig(CommonSettings, ):
         assert 1 <= v <= 128, "obs_radius must be in [1, 128]"
         return v
 
+    @validator('reuse_obs_buffer')
+    def reuse_obs_buffer_validation(cls, v, values):
+        if v:
+            assert values.get('observation_type') == 'default', \
+                "reuse_obs_buffer is supported only for 'default' observation_type"
+        return v
+
     @validator('map', always=True)
     def map_validation(cls, v, values):
         if v is None:
             return None
         if isinstance(v, str):
-            v, stocks, directions, agents_xy, targets_xy, possible_agents_xy, possible_targets_xy = cls.str_map_to_list(v, values['FREE'],
-                                                                                                    values['OBSTACLE'])
+            parsed_map = parse_str_map(v, values['FREE'], values['OBSTACLE'])
+            agents_xy, targets_xy = parsed_map.agents_xy, parsed_map.targets_xy
+            possible_agents_xy, possible_targets_xy = parsed_map.possible_agents_xy, parsed_map.possible_targets_xy
             if agents_xy and targets_xy and values.get('agents_xy') is not None and values.get(
                     'targets_xy') is not None:
                 raise KeyError("""Can't create task. Please provide agents_xy and targets_xy only once.
@@ -85,13 +100,25 @@ class GridConfig(CommonSettings, ):
             if (agents_xy or targets_xy) and (possible_agents_xy or possible_targets_xy):
                 raise KeyError("""Can't create task. Mark either possible locations or precise ones.""")
             elif agents_xy and targets_xy:
-                values['agents_xy'] = agents_xy
-                values['targets_xy'] = targets_xy
+                values['agents_xy'] = [list(xy) for xy in agents_xy]
+                values['targets_xy'] = [list(xy) for xy in targets_xy]
                 values['num_agents'] = len(agents_xy)
             elif (values.get('agents_xy') is None or values.get(
                     'targets_xy') is None) and possible_agents_xy and possible_targets_xy:
-                values['possible_agents_xy'] = possible_agents_xy
-                values['possible_targets_xy'] = possible_targets_xy
+                values['possible_agents_xy'] = list(possible_agents_xy)
+                values['possible_targets_xy'] = list(possible_targets_xy)
+            values['size'] = max(parsed_map.obstacles.shape)
+            values['density'] = parsed_map.density
+            return parsed_map.obstacles, parsed_map.stocks, parsed_map.directions
+
+        if len(v) == 3 and all(isinstance(layer, np.ndarray) and layer.ndim == 2 and layer.shape == v[0].shape
+                               for layer in v):
+            # already parsed (obstacles, stocks, directions) layers, e.g. when a config is rebuilt from another one
+            obstacles, stocks, directions = v
+            values['size'] = max(obstacles.shape)
+            values['density'] = obstacles.sum() / obstacles.size
+            return tuple(v)
+
         size = len(v)
         area = 0
         for line in v:
@@ -100,7 +127,13 @@ class GridConfig(CommonSettings, ):
         values['size'] = size
         values['density'] = sum([sum(line) for line in v]) / area
 
-        return v, stocks, directions
+        # the rows may be of different lengths, the missing cells are obstacles
+        obstacles = np.full((len(v), max(len(line) for line in v)), values['OBSTACLE'], dtype=np.int32)
+        for row, line in enumerate(v):
+            obstacles[row, :len(line)] = line
+        obstacles = _read_only(obstacles)
+        empty = _read_only(np.zeros_like(obstacles))
+        return obstacles, empty, empty
 
     @validator('possible_agents_xy')
     def possible_agents_xy_validation(cls, v):
@@ -207,3 +240,60 @@ class GridConfig(CommonSettings, ):
             possible_agents_xy, possible_targets_xy = None, None
 
         return obstacles, stocks, directions, agents_xy, targets_xy, possible_agents_xy, possible_targets_xy
+
+
+class ParsedMap(NamedTuple):
+    obstacles: np.ndarray
+    stocks: np.ndarray
+    directions: np.ndarray
+    agents_xy: tuple
+    targets_xy: tuple
+    possible_agents_xy: Optional[tuple]
+    possible_targets_xy: Optional[tuple]
+    density: float
+
+
+# parsed string maps keyed by the hash of their content, shared by all configs built from the same map
+_PARSED_MAPS = OrderedDict()
+PARSED_MAPS_CACHE_SIZE = 64
+
+
+def _read_only(array):
+    array.flags.writeable = False
+    return array
+
+
+def _to_tuples(positions):
+    return None if positions is None else tuple(tuple(xy) for xy in positions)
+
+
+def parse_str_map(str_map, free=0, obstacle=1):
+    """
+    Parses the string map with GridConfig.str_map_to_list once and caches the result by the hash of the map content,
+    so configs and resets built from the same map don't parse it again.
+    The arrays are read-only since they are shared, copy them before changing.
+    :param str_map: map in the string format
+    :param free: value of the free cells
+    :param obstacle: value of the obstacles
+    :return: ParsedMap with int32 obstacles, stocks and directions layers, agents, targets and possible positions
+    """
+    key = hashlib.blake2b(str_map.encode(), digest_size=16).digest(), free, obstacle
+    if key in _PARSED_MAPS:
+        _PARSED_MAPS.move_to_end(key)
+        return _PARSED_MAPS[key]
+
+    obstacles, stocks, directions, agents_xy, targets_xy, possible_agents_xy, possible_targets_xy = \
+        GridConfig.str_map_to_list(str_map, free, obstacle)
+    obstacles = _read_only(np.array(obstacles, dtype=np.int32))
+    parsed_map = ParsedMap(obstacles=obstacles,
+                           stocks=_read_only(np.array(stocks, dtype=np.int32)),
+                           directions=_read_only(np.array(directions, dtype=np.int32)),
+                           agents_xy=_to_tuples(agents_xy), targets_xy=_to_tuples(targets_xy),
+                           possible_agents_xy=_to_tuples(possible_agents_xy),
+                           possible_targets_xy=_to_tuples(possible_targets_xy),
+                           density=float(obstacles.sum() / obstacles.size))
+
+    _PARSED_MAPS[key] = parsed_map
+    if len(_PARSED_MAPS) > PARSED_MAPS_CACHE_SIZE:
+        _PARSED_MAPS.popitem(last=False)
+    return parsed_map
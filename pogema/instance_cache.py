@@ -0,0 +1,117 @@
+import hashlib
+import multiprocessing
+import os
+import tempfile
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from pogema.grid_config import GridConfig
+
+# fields of GridConfig the generated obstacles, starts and targets depend on (besides the seed)
+_INSTANCE_FIELDS = ('size', 'density', 'num_agents', 'map', 'map_name', 'agents_xy', 'targets_xy',
+                    'possible_agents_xy', 'possible_targets_xy', 'FREE', 'OBSTACLE', 'MOVES')
+# bump when the generation changes, so stale instances are not loaded
+_CACHE_VERSION = 1
+
+
+class Instance(NamedTuple):
+    obstacles: np.ndarray  # int8 (height, width), map without the artificial border
+    starts_xy: np.ndarray  # int32 (num_agents, 2)
+    targets_xy: np.ndarray  # int32 (num_agents, 2)
+
+
+def get_config_fingerprint(grid_config: GridConfig):
+    """
+    Returns the hex digest of the config fields the instance depends on, configs differing only by the seed,
+    observation radius, collision system, etc. share the fingerprint.
+    """
+    digest = hashlib.blake2b(repr(_CACHE_VERSION).encode(), digest_size=16)
+    for name in _INSTANCE_FIELDS:
+        value = getattr(grid_config, name)
+        if name == 'map' and value is not None:
+            # parsed map layers
+            for layer in value:
+                digest.update(repr(layer.shape).encode())
+                digest.update(np.ascontiguousarray(layer, dtype=np.int32).tobytes())
+        else:
+            digest.update(repr((name, value)).encode())
+    return digest.hexdigest()
+
+
+def get_instance_path(cache_dir, grid_config: GridConfig):
+    return os.path.join(cache_dir, get_config_fingerprint(grid_config), f'seed_{grid_config.seed}.npz')
+
+
+def save_instance(cache_dir, grid_config: GridConfig, instance: Instance):
+    """
+    Writes the instance into the cache atomically, so concurrent writers and readers never see partial files.
+    :return: path of the instance
+    """
+    path = get_instance_path(cache_dir, grid_config)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, obstacles=instance.obstacles, starts_xy=instance.starts_xy, targets_xy=instance.targets_xy)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return path
+
+
+def load_instance(cache_dir, grid_config: GridConfig) -> Optional[Instance]:
+    """
+    Loads the instance of the config from the cache.
+    :return: Instance or None if the config has no seed or the instance isn't cached
+    """
+    if grid_config.seed is None:
+        return None
+    path = get_instance_path(cache_dir, grid_config)
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        return Instance(obstacles=data['obstacles'], starts_xy=data['starts_xy'], targets_xy=data['targets_xy'])
+
+
+def _generate_instance(args):
+    from pogema.grid import Grid
+
+    cache_dir, grid_config, overwrite = args
+    if not overwrite and os.path.exists(get_instance_path(cache_dir, grid_config)):
+        return get_instance_path(cache_dir, grid_config)
+    # the border is random and depends only on the seed, so it's added again when the instance is loaded
+    grid = Grid(grid_config.copy(update=dict(instance_cache_dir=None)), add_artificial_border=False)
+    instance = Instance(obstacles=grid.obstacles.astype(np.int8), starts_xy=grid.agents_xy.copy(),
+                        targets_xy=grid.targets_xy.copy())
+    return save_instance(cache_dir, grid_config, instance)
+
+
+def generate_instances(grid_config: GridConfig, seeds, cache_dir, num_workers: Optional[int] = None,
+                       context: Optional[str] = None, overwrite: bool = False):
+    """
+    Generates the instances (obstacles, starts and targets) of the config for every seed in worker processes and
+    stores them in cache_dir under the config fingerprint. Grid loads them instead of generating, if the config has
+    instance_cache_dir set:
+
+        generate_instances(GridConfig(size=256, num_agents=1024), range(100), 'instances')
+        env = pogema_v0(GridConfig(size=256, num_agents=1024, seed=7, instance_cache_dir='instances'))
+
+    :param grid_config: base config, its seed is replaced by the seeds
+    :param seeds: iterable of seeds
+    :param cache_dir: directory of the cache
+    :param num_workers: number of processes, cpu_count by default, with 1 or less the instances are generated in the
+    current process
+    :param context: multiprocessing start method, e.g. 'fork' or 'spawn', the platform default is used if not set
+    :param overwrite: regenerate the instances which are already cached
+    :return: list of paths of the instances in the order of the seeds
+    """
+    tasks = [(cache_dir, grid_config.copy(update=dict(seed=seed)), overwrite) for seed in seeds]
+    if num_workers is None:
+        num_workers = multiprocessing.cpu_count()
+    num_workers = min(num_workers, len(tasks))
+    if num_workers <= 1:
+        return [_generate_instance(task) for task in tasks]
+    with multiprocessing.get_context(context).Pool(num_workers) as pool:
+        return pool.map(_generate_instance, tasks, chunksize=1)
@@ -37,13 +37,23 @@ class PogemaParallel:
         assert mode == 'human'
         return self.pogema.render()
 
-    def reset(self, seed=None, options=None):
-        observations, info = self.pogema.reset(seed=seed, options=options)
+    def reset(self, seed=None, return_info=False, options=None):
+        observations, infos = self.pogema.reset(seed=seed, options=options)
         self.agents = self.possible_agents[:]
         self.num_moves = 0
         observations = {agent: observations[self.agent_name_mapping[agent]].astype(np.float32) for agent in self.agents}
+        if return_info:
+            return observations, self._get_infos(infos)
         return observations
 
+    def _get_infos(self, infos):
+        anm = self.agent_name_mapping
+        d_infos = {agent: infos[anm[agent]] for agent in self.agents}
+        action_masks = self.pogema.get_action_masks().astype(np.int8)
+        for agent in self.agents:
+            d_infos[agent]['action_mask'] = action_masks[anm[agent]]
+        return d_infos
+
     def step(self, actions):
         anm = self.agent_name_mapping
 
@@ -54,7 +64,7 @@ class PogemaParallel:
         d_rewards = {agent: rewards[anm[agent]] for agent in self.agents}
         d_terminated = {agent: terminated[anm[agent]] for agent in self.agents}
         d_truncated = {agent: truncated[anm[agent]] for agent in self.agents}
-        d_infos = {agent: infos[anm[agent]] for agent in self.agents}
+        d_infos = self._get_infos(infos)
 
         for agent, idx in anm.items():
             if (not self.pogema.grid.is_active[idx] or all(truncated) or all(terminated)) and agent in self.agents:
@@ -49,15 +49,10 @@ class PyMarlPogema:
         return len(self.get_state())
 
     def get_avail_actions(self):
-        actions = []
-        for i in range(self.env.get_num_agents()):
-            actions.append(self.get_avail_agent_actions(i))
-        return actions
+        return self.env.get_action_masks().astype(np.int64).tolist()
 
-    # noinspection PyUnusedLocal
-    @staticmethod
-    def get_avail_agent_actions(agent_id):
-        return list(range(5))
+    def get_avail_agent_actions(self, agent_id):
+        return self.env.get_action_masks()[agent_id].astype(np.int64).tolist()
 
     @staticmethod
     def get_total_actions():
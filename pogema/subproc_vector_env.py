@@ -0,0 +1,406 @@
+import multiprocessing
+from collections import deque
+from multiprocessing.connection import wait
+from multiprocessing.shared_memory import SharedMemory
+from typing import Optional
+
+import gymnasium
+import numpy as np
+
+from pogema.envs import ActionsSampler
+from pogema.grid_config import GridConfig
+
+
+def _get_shared_specs(num_envs, grid_config: GridConfig):
+    """
+    Returns the shapes and dtypes of the arrays shared between the main process and the workers.
+    """
+    full_size = grid_config.obs_radius * 2 + 1
+    num_agents = grid_config.num_agents
+    return {
+        'obs': ((num_envs, num_agents, 4, full_size, full_size), np.float32),
+        'actions': ((num_envs, num_agents), np.int64),
+        'rewards': ((num_envs, num_agents), np.float32),
+        'terminated': ((num_envs, num_agents), np.bool_),
+        'truncated': ((num_envs, num_agents), np.bool_),
+        'is_active': ((num_envs, num_agents), np.bool_),
+        'done': ((num_envs,), np.bool_),
+    }
+
+
+def _attach_shared_arrays(shared_names, shared_specs):
+    memories, arrays = [], {}
+    for name, (shape, dtype) in shared_specs.items():
+        memory = SharedMemory(name=shared_names[name])
+        memories.append(memory)
+        arrays[name] = np.ndarray(shape, dtype=dtype, buffer=memory.buf)
+    return memories, arrays
+
+
+def _close_shared_memories(memories, unlink=False):
+    for memory in memories:
+        try:
+            memory.close()
+        except BufferError:
+            # the arrays returned to the caller may still reference the buffer, it is released with them
+            pass
+        if unlink:
+            memory.unlink()
+
+
+class _SharedEnvs:
+    """
+    Environments owned by one worker, writing their results straight into the shared arrays.
+    """
+
+    def __init__(self, grid_configs, env_ids, arrays):
+        self.grid_configs = grid_configs
+        self.env_ids = env_ids
+        self.arrays = arrays
+        self.envs = {}
+
+    def _make_env(self, env_idx, grid_config):
+        from pogema.integrations.make_pogema import make_pogema
+
+        env = make_pogema(grid_config)
+        # 'default' observations are written in place into the shared buffer, so they are never copied or pickled
+        env.unwrapped.set_obs_buffer(self.arrays['obs'][env_idx])
+        self.envs[env_idx] = env
+
+    def _write_infos(self, env_idx, infos):
+        self.arrays['is_active'][env_idx] = [info['is_active'] for info in infos]
+
+    def reset(self, env_ids, seed=None):
+        for env_idx in env_ids:
+            if seed is not None or env_idx not in self.envs:
+                grid_config = self.grid_configs[env_idx]
+                if seed is not None:
+                    grid_config = grid_config.copy(update=dict(seed=seed + env_idx))
+                self._make_env(env_idx, grid_config)
+            _, infos = self.envs[env_idx].reset()
+            self._write_infos(env_idx, infos)
+            self.arrays['rewards'][env_idx] = 0.0
+            self.arrays['terminated'][env_idx] = False
+            self.arrays['truncated'][env_idx] = False
+            self.arrays['done'][env_idx] = False
+
+    def step(self, env_ids):
+        """
+        Steps the environments with the actions from the shared array, finished environments are reset.
+        :return: the metrics of the finished episodes by environment index
+        """
+        metrics = {}
+        for env_idx in env_ids:
+            env = self.envs[env_idx]
+            _, rewards, terminated, truncated, infos = env.step(self.arrays['actions'][env_idx])
+            self.arrays['rewards'][env_idx] = rewards
+            self.arrays['terminated'][env_idx] = terminated
+            self.arrays['truncated'][env_idx] = truncated
+
+            done = all(terminated) or all(truncated)
+            self.arrays['done'][env_idx] = done
+            if done:
+                if 'metrics' in infos[0]:
+                    metrics[env_idx] = infos[0]['metrics']
+                _, infos = env.reset()
+            self._write_infos(env_idx, infos)
+        return metrics
+
+
+def _worker(pipe, parent_pipe, shared_names, shared_specs, grid_configs, env_ids):
+    parent_pipe.close()
+    memories, arrays = _attach_shared_arrays(shared_names, shared_specs)
+    envs = _SharedEnvs(grid_configs, env_ids, arrays)
+    try:
+        while True:
+            command, data = pipe.recv()
+            if command == 'reset':
+                ids, seed = data
+                envs.reset(env_ids if ids is None else ids, seed)
+                pipe.send(('ok', None))
+            elif command == 'step':
+                pipe.send(('ok', envs.step(env_ids if data is None else data)))
+            elif command == 'reset_each':
+                # replies as soon as each environment is ready, used by PogemaAsyncEnvPool
+                for env_idx in data:
+                    envs.reset([env_idx])
+                    pipe.send(('ok', (env_idx, {})))
+            elif command == 'step_each':
+                for env_idx in data:
+                    pipe.send(('ok', (env_idx, envs.step([env_idx]))))
+            elif command == 'close':
+                break
+            else:
+                raise KeyError(f'Unknown command: {command}')
+    except KeyboardInterrupt:
+        pass
+    except Exception as error:
+        pipe.send(('error', repr(error)))
+    finally:
+        del arrays, envs
+        _close_shared_memories(memories)
+        pipe.close()
+
+
+class PogemaSubprocVectorEnv:
+    """
+    Runs num_envs environments created by make_pogema in num_workers subprocesses. The workers write observations,
+    rewards and flags straight into multiprocessing.shared_memory arrays and the actions are read from a shared
+    array too, so only small step and reset commands go over the pipes and the observations are never pickled.
+
+    The returned observations are a view of the shared buffer of shape (num_envs, num_agents, 4, 2r+1, 2r+1), they
+    are overwritten by the next step or reset, copy them if you need to keep them. Finished environments are reset
+    automatically. Only the 'default' observation_type is supported.
+    """
+
+    def __init__(self, grid_config: GridConfig = GridConfig(num_agents=2), num_envs: int = 1,
+                 num_workers: Optional[int] = None, context: Optional[str] = None):
+        if grid_config.observation_type != 'default':
+            raise ValueError(f"PogemaSubprocVectorEnv supports only 'default' observation_type, "
+                             f"got {grid_config.observation_type}")
+        if grid_config.integration is not None:
+            raise ValueError(f"PogemaSubprocVectorEnv doesn't support integrations, got {grid_config.integration}")
+        if num_envs < 1:
+            raise ValueError(f"num_envs must be positive, got {num_envs}")
+        if num_workers is None:
+            num_workers = min(num_envs, multiprocessing.cpu_count())
+        num_workers = max(1, min(num_workers, num_envs))
+
+        self.grid_config = grid_config
+        self.num_envs = num_envs
+        self.num_workers = num_workers
+        self.closed = False
+
+        full_size = grid_config.obs_radius * 2 + 1
+        self.action_space = gymnasium.spaces.Discrete(len(grid_config.MOVES))
+        self.observation_space = gymnasium.spaces.Box(-1.0, 1.0, shape=(4, full_size, full_size))
+        self._multi_action_sampler = ActionsSampler(self.action_space.n, seed=grid_config.seed)
+
+        self._memories = []
+        self._arrays = {}
+        shared_specs = _get_shared_specs(num_envs, grid_config)
+        for name, (shape, dtype) in shared_specs.items():
+            memory = SharedMemory(create=True, size=max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize))
+            self._memories.append(memory)
+            self._arrays[name] = np.ndarray(shape, dtype=dtype, buffer=memory.buf)
+        shared_names = {name: memory.name for name, memory in zip(shared_specs, self._memories)}
+
+        grid_configs = [grid_config if grid_config.seed is None else grid_config.copy(
+            update=dict(seed=grid_config.seed + env_idx)) for env_idx in range(num_envs)]
+
+        ctx = multiprocessing.get_context(context)
+        self._pipes, self._processes = [], []
+        self._worker_env_ids = [ids.tolist() for ids in np.array_split(np.arange(num_envs), num_workers)]
+        self._env_to_worker = np.zeros(num_envs, dtype=np.int64)
+        for worker_idx, env_ids in enumerate(self._worker_env_ids):
+            self._env_to_worker[env_ids] = worker_idx
+        for env_ids in self._worker_env_ids:
+            pipe, worker_pipe = ctx.Pipe()
+            process = ctx.Process(target=_worker, args=(worker_pipe, pipe, shared_names, shared_specs,
+                                                        grid_configs, env_ids), daemon=True)
+            process.start()
+            worker_pipe.close()
+            self._pipes.append(pipe)
+            self._processes.append(process)
+
+    def _receive(self, pipe):
+        status, data = pipe.recv()
+        if status == 'error':
+            raise RuntimeError(f'Pogema worker failed: {data}')
+        return data
+
+    def _check_closed(self):
+        if self.closed:
+            raise ValueError(f'Trying to use closed {type(self).__name__}')
+
+    def reset(self, seed: Optional[int] = None, return_info: bool = True):
+        """
+        Resets all environments.
+        :param seed: if set, environment i is recreated with seed + i
+        :param return_info:
+        :return:
+        """
+        self._check_closed()
+        for pipe in self._pipes:
+            pipe.send(('reset', (None, seed)))
+        for pipe in self._pipes:
+            self._receive(pipe)
+
+        if return_info:
+            return self._arrays['obs'], self._get_infos({})
+        return self._arrays['obs']
+
+    def step_async(self, actions):
+        self._check_closed()
+        self._arrays['actions'][...] = np.asarray(actions).reshape(self._arrays['actions'].shape)
+        for pipe in self._pipes:
+            pipe.send(('step', None))
+
+    def step_wait(self):
+        metrics = {}
+        for pipe in self._pipes:
+            metrics.update(self._receive(pipe))
+        return (self._arrays['obs'], self._arrays['rewards'].copy(), self._arrays['terminated'].copy(),
+                self._arrays['truncated'].copy(), self._get_infos(metrics))
+
+    def step(self, actions):
+        """
+        Makes one step in all environments.
+        :param actions: int array of shape (num_envs, num_agents)
+        :return: observations, rewards, terminated, truncated and infos, stacked over the environments
+        """
+        self.step_async(actions)
+        return self.step_wait()
+
+    def _get_infos(self, metrics):
+        return {'is_active': self._arrays['is_active'].copy(), 'done': self._arrays['done'].copy(),
+                'metrics': metrics}
+
+    def sample_actions(self):
+        return self._multi_action_sampler.sample_actions(dim=(self.num_envs, self.grid_config.num_agents))
+
+    def get_num_agents(self):
+        return self.grid_config.num_agents
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        for pipe in self._pipes:
+            try:
+                pipe.send(('close', None))
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        for pipe in self._pipes:
+            pipe.close()
+        self._arrays = {}
+        _close_shared_memories(self._memories, unlink=True)
+        self._memories = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __del__(self):
+        if not getattr(self, 'closed', True):
+            self.close()
+
+
+class PogemaAsyncEnvPool(PogemaSubprocVectorEnv):
+    """
+    Asynchronous pool of environments in the spirit of EnvPool. The caller sends actions to any subset of the
+    environments and receives the batch_size environments that finished stepping or resetting first, so a slow
+    reset (e.g. retries of the grid generation) doesn't stall the whole batch.
+
+        pool.async_reset()
+        while True:
+            obs, rewards, terminated, truncated, infos = pool.recv()
+            pool.send(policy(obs), infos['env_id'])
+
+    The results are gathered from the shared buffers, so received observations are copies and stay valid.
+    """
+
+    def __init__(self, grid_config: GridConfig = GridConfig(num_agents=2), num_envs: int = 1,
+                 batch_size: Optional[int] = None, num_workers: Optional[int] = None, context: Optional[str] = None):
+        if batch_size is None:
+            batch_size = num_envs
+        if not 1 <= batch_size <= num_envs:
+            raise ValueError(f"batch_size must be between 1 and num_envs={num_envs}, got {batch_size}")
+        super().__init__(grid_config, num_envs, num_workers, context)
+        self.batch_size = batch_size
+
+        # sent and not yet returned by recv / still computed by the workers
+        self._pending = np.zeros(num_envs, dtype=bool)
+        self._running = np.zeros(num_envs, dtype=bool)
+        self._ready = deque()
+        self._metrics = {}
+        self._last_env_ids = np.arange(num_envs)
+
+    def _send_each(self, command, env_ids):
+        self._pending[env_ids] = True
+        self._running[env_ids] = True
+        workers = self._env_to_worker[env_ids]
+        for worker_idx in np.unique(workers):
+            self._pipes[worker_idx].send((command, env_ids[workers == worker_idx].tolist()))
+
+    def _check_not_pending(self, env_ids):
+        if self._pending[env_ids].any():
+            raise ValueError(f"Environments {np.asarray(env_ids)[self._pending[env_ids]].tolist()} "
+                             f"are not received yet")
+
+    def async_reset(self):
+        """
+        Starts resetting all environments, the results are collected by recv.
+        """
+        self._check_closed()
+        env_ids = np.arange(self.num_envs)
+        self._check_not_pending(env_ids)
+        self._send_each('reset_each', env_ids)
+
+    def send(self, actions, env_ids=None):
+        """
+        Starts stepping the given environments.
+        :param actions: int array of shape (len(env_ids), num_agents)
+        :param env_ids: indices of the environments, by default the ones returned by the last recv
+        :return:
+        """
+        self._check_closed()
+        env_ids = self._last_env_ids if env_ids is None else np.asarray(env_ids, dtype=np.int64).reshape(-1)
+        self._check_not_pending(env_ids)
+        if len(np.unique(env_ids)) != len(env_ids):
+            raise ValueError("Duplicated environment ids")
+        self._arrays['actions'][env_ids] = np.asarray(actions).reshape(len(env_ids), self.grid_config.num_agents)
+        self._send_each('step_each', env_ids)
+
+    def recv(self, batch_size: Optional[int] = None):
+        """
+        Waits for the first batch_size environments that finished stepping or resetting.
+        :return: observations, rewards, terminated, truncated and infos of these environments, stacked over them in
+        the order they became ready, infos['env_id'] holds their indices
+        """
+        self._check_closed()
+        batch_size = self.batch_size if batch_size is None else batch_size
+        if batch_size > self._pending.sum():
+            raise ValueError(f"Can't receive {batch_size} environments, only {self._pending.sum()} are sent")
+
+        while len(self._ready) < batch_size:
+            busy_pipes = [self._pipes[worker_idx] for worker_idx in np.unique(self._env_to_worker[self._running])]
+            for pipe in wait(busy_pipes):
+                env_idx, metrics = self._receive(pipe)
+                self._running[env_idx] = False
+                self._ready.append(env_idx)
+                self._metrics.update(metrics)
+
+        env_ids = np.array([self._ready.popleft() for _ in range(batch_size)], dtype=np.int64)
+        self._pending[env_ids] = False
+        self._last_env_ids = env_ids
+        infos = {'env_id': env_ids,
+                 'is_active': self._arrays['is_active'][env_ids],
+                 'done': self._arrays['done'][env_ids],
+                 'metrics': {env_idx: self._metrics.pop(env_idx) for env_idx in env_ids.tolist()
+                             if env_idx in self._metrics}}
+        return (self._arrays['obs'][env_ids], self._arrays['rewards'][env_ids], self._arrays['terminated'][env_ids],
+                self._arrays['truncated'][env_ids], infos)
+
+    def reset(self, seed: Optional[int] = None, return_info: bool = True):
+        self._check_not_pending(np.arange(self.num_envs))
+        self._last_env_ids = np.arange(self.num_envs)
+        return super().reset(seed, return_info)
+
+    def step_async(self, actions):
+        self._check_not_pending(np.arange(self.num_envs))
+        self._last_env_ids = np.arange(self.num_envs)
+        super().step_async(actions)
+
+    def step(self, actions, env_ids=None):
+        """
+        Sends the actions to the given environments and receives the next ready batch.
+        """
+        self.send(actions, env_ids)
+        return self.recv()
@@ -1,5 +1,6 @@
 import sys
 
+import numpy as np
 from pydantic import BaseModel
 
 from typing_extensions import Literal
@@ -13,7 +14,7 @@ def grid_to_str(grid):
     return '\n'.join(''.join('.' if cell == 0 else '#' for cell in row) for row in grid)
 
 
-def check_grid(obstacles, agents_xy, targets_xy):
+def check_grid(obstacles, agents_xy, targets_xy, directions=None):
     if bool(agents_xy) != bool(targets_xy):
         raise AgentsTargetsSizeError("Agents and targets must be defined together/undefined together!")
 
@@ -23,21 +24,168 @@ def check_grid(obstacles, agents_xy, targets_xy):
     if len(agents_xy) != len(targets_xy):
         raise IndexError("Can't create task. Please provide agents_xy and targets_xy of the same size.")
 
+    obstacles = np.asarray(obstacles)
+    starts, targets = np.array(agents_xy).reshape(-1, 2), np.array(targets_xy).reshape(-1, 2)
+
     # check overlapping of agents
-    for i in range(len(agents_xy)):
-        for j in range(i + 1, len(agents_xy)):
-            if agents_xy[i] == agents_xy[j]:
-                raise ValueError(f"Agents can't overlap! {agents_xy[i]} is in both {i} and {j} position.")
-
-    for start_xy, finish_xy in zip(agents_xy, targets_xy):
-        s_x, s_y = start_xy
-        if obstacles[s_x, s_y]:
-            raise KeyError(f'Cell is {s_x, s_y} occupied by obstacle.')
-        f_x, f_y = finish_xy
-        if obstacles[f_x, f_y]:
-            raise KeyError(f'Cell is {f_x, f_y} occupied by obstacle.')
-
-    # todo check connectivity of starts and finishes
+    cells = starts[:, 0] * obstacles.shape[1] + starts[:, 1]
+    unique_cells, first_ids, counts = np.unique(cells, return_index=True, return_counts=True)
+    if (counts > 1).any():
+        i = int(first_ids[counts > 1].min())
+        j = int(np.flatnonzero(cells == cells[i])[1])
+        raise ValueError(f"Agents can't overlap! {agents_xy[i]} is in both {i} and {j} position.")
+
+    for xy in [starts, targets]:
+        occupied = np.flatnonzero(obstacles[xy[:, 0], xy[:, 1]])
+        if len(occupied):
+            x, y = xy[occupied[0]].tolist()
+            raise KeyError(f'Cell is {x, y} occupied by obstacle.')
+
+    unreachable = get_unreachable_targets(obstacles, starts, targets, directions)
+    if len(unreachable):
+        i = unreachable[0]
+        raise ValueError(f"Target {targets_xy[i]} of agent {i} is unreachable from its start {agents_xy[i]}.")
+
+
+def _find_roots(parent):
+    """
+    Compresses the union-find forest in place with pointer jumping, so every element points to its root.
+    """
+    while True:
+        grandparent = parent[parent]
+        if np.array_equal(grandparent, parent):
+            return parent
+        parent[:] = grandparent
+
+
+def union_find(num_nodes, first, second):
+    """
+    Merges the nodes connected by the edges (first[i], second[i]) with union-find over arrays.
+    :return: int32 component index of each node, the components are numbered in the order of their lowest node,
+    and the number of components
+    """
+    parent = np.arange(num_nodes, dtype=np.int32)
+    while len(first):
+        root_first, root_second = parent[first], parent[second]
+        different = root_first != root_second
+        first, second = first[different], second[different]
+        root_first, root_second = root_first[different], root_second[different]
+        if not len(first):
+            break
+        # every root is hooked to the lowest root it is linked to, a plain assignment would keep only one of
+        # the links of a root and take a pass per link
+        np.minimum.at(parent, np.maximum(root_first, root_second), np.minimum(root_first, root_second))
+        _find_roots(parent)
+
+    # the roots are the lowest nodes of the components
+    is_root = parent == np.arange(num_nodes)
+    return (np.cumsum(is_root, dtype=np.int32) - 1)[parent], int(is_root.sum())
+
+
+def get_unreachable_targets(obstacles, starts_xy, targets_xy, directions=None, moves=None):
+    """
+    Finds the agents which can't reach their targets. The moves allowed by the direction types of the cells are
+    one-way: e.g. a cell with vertical direction can be entered from the side, but not left to the side.
+    The cells connected both ways are labelled once, the one-way moves between these components are followed
+    only for the pairs with the start and the target in different components.
+    :param obstacles: 2d array, not zero cells are blocked
+    :param starts_xy: int array of shape (num_agents, 2)
+    :param targets_xy: int array of shape (num_agents, 2)
+    :param directions: int array of the direction types of the cells, no constraints if not set
+    :param moves: list of moves, CommonSettings.MOVES by default
+    :return: int array of the indices of the agents with unreachable targets
+    """
+    moves = [list(move) for move in (CommonSettings().MOVES if moves is None else moves)]
+    blocked = np.asarray(obstacles) != 0
+    height, width = blocked.shape
+    if directions is None:
+        directions = np.zeros((height, width), dtype=np.int32)
+    legal = get_legal_moves_mask(blocked, np.asarray(directions), moves).ravel()
+
+    two_way, one_way = [], []
+    for action, (dx, dy) in enumerate(moves):
+        if dx == 0 and dy == 0:
+            continue
+        sources = np.flatnonzero((legal >> action) & 1)
+        destinations = sources + dx * width + dy
+        if [-dx, -dy] in moves:
+            back = (legal[destinations] >> moves.index([-dx, -dy])) & 1 == 1
+        else:
+            back = np.zeros(len(sources), dtype=bool)
+        two_way.append((sources[back], destinations[back]))
+        one_way.append((sources[~back], destinations[~back]))
+
+    components, num_components = union_find(height * width, *(np.concatenate(edges) for edges in zip(*two_way)))
+    starts = components[np.asarray(starts_xy)[:, 0] * width + np.asarray(starts_xy)[:, 1]]
+    targets = components[np.asarray(targets_xy)[:, 0] * width + np.asarray(targets_xy)[:, 1]]
+    reachable = starts == targets
+
+    # one-way moves between the components
+    sources, destinations = (components[np.concatenate(edges)] for edges in zip(*one_way))
+    edges = np.unique(sources[sources != destinations].astype(np.int64) * num_components +
+                      destinations[sources != destinations])
+    sources, destinations = np.divmod(edges, num_components)
+    for source in np.unique(starts[~reachable]):
+        reached = np.zeros(num_components, dtype=bool)
+        reached[source] = True
+        while True:
+            new = destinations[reached[sources] & ~reached[destinations]]
+            if not len(new):
+                break
+            reached[new] = True
+        pairs = ~reachable & (starts == source)
+        reachable[pairs] = reached[targets[pairs]]
+    return np.flatnonzero(~reachable)
+
+
+# whether the vehicle type can drive through the cells with stocks
+VEHICLE_CAN_PASS_STOCKS = {
+    'small': True,
+    'standard': False,
+    'heavy': False,
+}
+
+
+def get_direction_moves_table(moves):
+    """
+    Returns uint8 table of the moves allowed by each direction type (0 - any, 1 - left/right, 2 - up/down),
+    bit i is set if the move i is allowed. Staying is allowed everywhere.
+    """
+    table = np.zeros(3, dtype=np.uint8)
+    for action, (dx, dy) in enumerate(moves):
+        for direction_type, allowed in enumerate([True, dx == 0, dy == 0]):
+            if allowed:
+                table[direction_type] |= 1 << action
+    return table
+
+
+def get_legal_moves_mask(blocked, directions, moves, outside_blocked=True):
+    """
+    Precomputes the legal moves for every cell as uint8 bitmask, bit i is set if the move i is legal from the cell:
+    the target cell is not blocked and the direction type of the cell permits the move. Staying is always legal,
+    the cells of unknown direction types permit only staying.
+    :param blocked: bool array, True for the cells agents can't enter (obstacles and, for some vehicles, stocks)
+    :param directions: int array of the direction types of the cells
+    :param moves: list of (dx, dy) moves, e.g. GridConfig.MOVES
+    :param outside_blocked: whether the cells outside the array are blocked
+    :return: uint8 array of the same shape as blocked
+    """
+    table = get_direction_moves_table(moves)
+    stay = np.uint8(sum(1 << action for action, (dx, dy) in enumerate(moves) if dx == 0 and dy == 0))
+    known = (directions >= 0) & (directions < len(table))
+    direction_mask = np.where(known, table[np.where(known, directions, 0)], stay).astype(np.uint8)
+
+    height, width = blocked.shape
+    padded = np.pad(np.asarray(blocked, dtype=bool), 1, constant_values=outside_blocked)
+    mask = np.zeros((height, width), dtype=np.uint8)
+    for action, (dx, dy) in enumerate(moves):
+        bit = np.uint8(1 << action)
+        if dx == 0 and dy == 0:
+            target_free = True
+        else:
+            target_free = ~padded[1 + dx:1 + dx + height, 1 + dy:1 + dy + width]
+        mask |= np.where(target_free & ((direction_mask & bit) != 0), bit, np.uint8(0)).astype(np.uint8)
+    return mask
 
 
 def render_grid(obstacles, positions_xy=None, targets_xy=None, is_active=None, mode='human'):
@@ -0,0 +1,209 @@
+from typing import Optional
+
+import gymnasium
+import numpy as np
+
+from pogema.envs import ActionsSampler, _make_base_pogema
+from pogema.functional import COLLISION_RESOLVERS, PogemaState, move_agents, apply_on_target
+from pogema.grid_config import GridConfig
+
+# grid layers and agents arrays which are stacked over the environments
+_GRID_LAYERS = ('obstacles', 'stocks', 'directions', 'positions', 'occupancy', 'legal_moves')
+_AGENTS_ARRAYS = ('agents_xy', 'targets_xy', 'active', '_initial_xy')
+
+
+class PogemaVectorEnv:
+    """
+    Runs num_envs environments with grids of the same shape in lockstep. The grids of all environments are stacked
+    into (K, H, W) arrays and the agents state into (K, N, ...) arrays, so moves, collisions, rewards and observations
+    of all environments are computed with a few NumPy calls.
+
+    The Grid of every sub-environment works on views of the stacked arrays, so resets and lifelong target generation
+    reuse the code of the single environment. Sub-environments are reset automatically once all their agents are
+    terminated or truncated; step returns the first observation of the new episode for them.
+    Only the 'default' observation_type is supported.
+    """
+
+    def __init__(self, grid_config: GridConfig = GridConfig(num_agents=2), num_envs: int = 1):
+        if grid_config.observation_type != 'default':
+            raise ValueError(f"PogemaVectorEnv supports only 'default' observation_type, "
+                             f"got {grid_config.observation_type}")
+        if grid_config.collision_system not in COLLISION_RESOLVERS:
+            raise ValueError('Unknown collision system: {}'.format(grid_config.collision_system))
+        if num_envs < 1:
+            raise ValueError(f"num_envs must be positive, got {num_envs}")
+
+        self.grid_config = grid_config
+        self.num_envs = num_envs
+        self.envs = [_make_base_pogema(self._get_env_config(grid_config.seed, env_idx))
+                     for env_idx in range(num_envs)]
+
+        full_size = grid_config.obs_radius * 2 + 1
+        self.action_space = gymnasium.spaces.Discrete(len(grid_config.MOVES))
+        self.observation_space = gymnasium.spaces.Box(-1.0, 1.0, shape=(4, full_size, full_size))
+        self._multi_action_sampler = ActionsSampler(self.action_space.n, seed=grid_config.seed)
+
+        self.elapsed_steps = np.zeros(num_envs, dtype=np.int64)
+        self._obs_buffer = None
+        if grid_config.reuse_obs_buffer:
+            self._obs_buffer = np.zeros((num_envs, grid_config.num_agents, 4, full_size, full_size),
+                                        dtype=np.float32)
+
+        for name in _GRID_LAYERS + _AGENTS_ARRAYS:
+            setattr(self, name, None)
+
+    def _get_env_config(self, seed, env_idx):
+        if seed is None:
+            return self.grid_config
+        return self.grid_config.copy(update=dict(seed=seed + env_idx))
+
+    def _stack_grid(self, env_idx):
+        """
+        Copies the state of the freshly created grid of the sub-environment into the stacked arrays and rebinds
+        the grid to the views of them.
+        """
+        grid = self.envs[env_idx].grid
+        if self.obstacles is None:
+            for name in _GRID_LAYERS + _AGENTS_ARRAYS:
+                array = getattr(grid, name)
+                setattr(self, name, np.zeros((self.num_envs,) + array.shape, dtype=array.dtype))
+        for name in _GRID_LAYERS + _AGENTS_ARRAYS:
+            stacked, array = getattr(self, name), getattr(grid, name)
+            if stacked.shape[1:] != array.shape:
+                raise ValueError(f"All grids of PogemaVectorEnv must have the same shape, "
+                                 f"got {name} of shape {array.shape} instead of {stacked.shape[1:]}")
+            stacked[env_idx] = array
+            setattr(grid, name, stacked[env_idx])
+
+    def _reset_envs(self, env_ids, seed=None):
+        for env_idx in env_ids:
+            env = self.envs[env_idx]
+            # the observations are built for all environments at once, so only the grid is created here
+            if self.grid_config.fast_reset and env.grid is not None:
+                # the config of the sub-environment holds its current seed, also for the automatic resets
+                env._reset_grid(env.grid_config.seed)
+            else:
+                env._initialize_grid()
+            self._stack_grid(env_idx)
+        self.elapsed_steps[env_ids] = 0
+
+    def reset(self, seed: Optional[int] = None, return_info: bool = True):
+        """
+        Resets all sub-environments.
+        :param seed: if set, sub-environment i is reseeded with seed + i
+        :param return_info:
+        :return: observations of shape (num_envs, num_agents, 4, 2r+1, 2r+1)
+        """
+        if seed is not None:
+            for env_idx, env in enumerate(self.envs):
+                env.grid_config = self._get_env_config(seed, env_idx)
+        self._reset_envs(np.arange(self.num_envs), seed)
+
+        if return_info:
+            return self._obs(), self._get_infos(np.zeros(self.num_envs, dtype=bool))
+        return self._obs()
+
+    def step(self, actions):
+        """
+        Makes one step in all sub-environments.
+        :param actions: int array of shape (num_envs, num_agents)
+        :return: observations, rewards, terminated, truncated and infos, everything is stacked over the
+        sub-environments, e.g. rewards are of shape (num_envs, num_agents)
+        """
+        if self.obstacles is None:
+            raise gymnasium.error.ResetNeeded("Please reset environment first!")
+        actions = np.asarray(actions).reshape(self.num_envs, self.grid_config.num_agents)
+
+        self.move_agents(actions)
+
+        state, rewards, terminated = apply_on_target(PogemaState(self.agents_xy, self.targets_xy, self.active),
+                                                     self.grid_config.on_target)
+        if self.grid_config.on_target == 'finish':
+            self._hide_agents(self.active & ~state.active)
+        elif self.grid_config.on_target == 'restart':
+            on_goal = (self.agents_xy == self.targets_xy).all(axis=-1)
+            for env_idx in np.flatnonzero(on_goal.any(axis=1)):
+                agent_ids = np.flatnonzero(on_goal[env_idx])
+                self.targets_xy[env_idx, agent_ids] = self.envs[env_idx]._generate_new_targets(agent_ids)
+
+        self.elapsed_steps += 1
+        truncated = np.repeat((self.elapsed_steps >= self.grid_config.max_episode_steps)[:, None],
+                              self.grid_config.num_agents, axis=1)
+
+        done = terminated.all(axis=1) | truncated.all(axis=1)
+        infos = self._get_infos(done)
+        if done.any():
+            self._reset_envs(np.flatnonzero(done))
+
+        return self._obs(), rewards, terminated, truncated, infos
+
+    def move_agents(self, actions):
+        new_xy = move_agents(PogemaState(self.agents_xy, self.targets_xy, self.active), actions, self.legal_moves,
+                             self.grid_config.MOVES, self.grid_config.collision_system, occupancy=self.occupancy)
+
+        env_ids, agent_ids = np.nonzero((new_xy != self.agents_xy).any(axis=-1))
+        x, y = self.agents_xy[env_ids, agent_ids].T
+        self.positions[env_ids, x, y] = self.grid_config.FREE
+        self.occupancy[env_ids, x, y] = -1
+
+        x, y = new_xy[env_ids, agent_ids].T
+        self.positions[env_ids, x, y] = self.grid_config.OBSTACLE
+        self.occupancy[env_ids, x, y] = agent_ids
+        self.agents_xy[env_ids, agent_ids] = new_xy[env_ids, agent_ids]
+
+    def _hide_agents(self, mask):
+        env_ids, agent_ids = np.nonzero(mask)
+        x, y = self.agents_xy[env_ids, agent_ids].T
+        self.active[env_ids, agent_ids] = False
+        self.positions[env_ids, x, y] = self.grid_config.FREE
+        self.occupancy[env_ids, x, y] = -1
+
+    def _windows(self, layer, out):
+        r = self.grid_config.obs_radius
+        full_size = r * 2 + 1
+        num_envs, height, width = layer.shape
+        stride_env, stride_x, stride_y = layer.strides
+        windows = np.lib.stride_tricks.as_strided(layer, shape=(num_envs, height - full_size + 1,
+                                                                width - full_size + 1, full_size, full_size),
+                                                  strides=(stride_env, stride_x, stride_y, stride_x, stride_y),
+                                                  writeable=False)
+        env_ids = np.arange(num_envs)[:, None]
+        out[...] = windows[env_ids, self.agents_xy[..., 0] - r, self.agents_xy[..., 1] - r]
+
+    def _obs(self):
+        """
+        Returns the 'default' observations of all agents in all environments as one float32 array of shape
+        (num_envs, num_agents, 4, 2r+1, 2r+1). The channels are obstacles, stocks, agents and the target.
+        """
+        r = self.grid_config.obs_radius
+        full_size = r * 2 + 1
+        out = self._obs_buffer
+        if out is None:
+            out = np.empty((self.num_envs, self.grid_config.num_agents, 4, full_size, full_size), dtype=np.float32)
+
+        self._windows(self.obstacles, out[:, :, 0])
+        self._windows(self.stocks, out[:, :, 1])
+        self._windows(self.positions, out[:, :, 2])
+
+        targets = out[:, :, 3]
+        targets[...] = 0.0
+        dx, dy = np.moveaxis(np.clip(self.agents_xy - self.targets_xy, -r, r), -1, 0)
+        env_ids, agent_ids = np.indices(dx.shape)
+        targets[env_ids, agent_ids, r - dx, r - dy] = 1.0
+        return out
+
+    def _get_infos(self, done):
+        return {'is_active': self.active.copy(), 'done': done}
+
+    def get_action_masks(self):
+        """
+        Returns (num_envs, num_agents, num_actions) bool array of the actions each agent can take right now.
+        """
+        return np.stack([env.grid.get_action_masks() for env in self.envs])
+
+    def sample_actions(self):
+        return self._multi_action_sampler.sample_actions(
+            dim=(self.num_envs, self.grid_config.num_agents))
+
+    def get_num_agents(self):
+        return self.grid_config.num_agents
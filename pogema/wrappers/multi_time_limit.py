@@ -14,3 +14,12 @@ class MultiTimeLimit(TimeLimit):
             raise ValueError("Cannot set elapsed steps for non-persistent environment!")
         assert elapsed_steps >= 0
         self._elapsed_steps = elapsed_steps
+
+    def get_snapshot(self):
+        snapshot = self.env.get_snapshot()
+        snapshot['elapsed_steps'] = self._elapsed_steps
+        return snapshot
+
+    def restore(self, snapshot):
+        self.env.restore(snapshot)
+        self._elapsed_steps = snapshot['elapsed_steps']
@@ -0,0 +1,31 @@
+import json
+
+from pogema.benchmark import BENCHMARKS, run_benchmarks, compare, main
+
+
+def test_run_benchmarks():
+    report = run_benchmarks(sizes=[16], densities=[0.2], num_agents=[4, 1000], repeats=2)
+    assert [result['benchmark'] for result in report['results']] == list(BENCHMARKS)
+    for result in report['results']:
+        assert result['size'] == 16 and result['num_agents'] == 4 and len(result['times']) == 2
+        assert 0 <= result['min'] <= result['median']
+
+    # the A* benchmarks skip the maps above their max_size
+    report = run_benchmarks(['a_star_short'], sizes=[16, 1024], densities=[0.2], num_agents=[4], repeats=1)
+    assert [result['size'] for result in report['results']] == [16]
+
+
+def test_compare_with_baseline(tmp_path):
+    output = tmp_path / 'results.json'
+    args = ['--benchmarks', 'grid_init', 'reset_agents', '--sizes', '16', '--densities', '0.3', '--num_agents', '8',
+            '--repeats', '1']
+    assert main(args + ['--output', str(output)]) == 0
+    baseline = json.loads(output.read_text())
+    assert {result['benchmark'] for result in baseline['results']} == {'grid_init', 'reset_agents'}
+
+    slower = json.loads(output.read_text())
+    for result in slower['results']:
+        result['min'] = result['min'] * 2 + 1.0
+    regressions = compare(baseline, slower)
+    assert [key for key, _, _ in regressions] == [('grid_init', 16, 0.3, 8), ('reset_agents', 16, 0.3, 8)]
+    assert compare(slower, baseline) == []
@@ -0,0 +1,161 @@
+from copy import deepcopy
+
+import numpy as np
+
+from pogema import GridConfig
+from pogema.collisions import resolve_priority, resolve_block_both, resolve_soft
+from pogema.grid import Grid
+
+
+def random_grids(num_cases=200, seed=0):
+    rng = np.random.default_rng(seed)
+    for case in range(num_cases):
+        size = int(rng.integers(2, 10))
+        density = float(rng.uniform(0.0, 0.4))
+        free_cells = size * size
+        num_agents = int(rng.integers(1, max(2, free_cells // 2)))
+        try:
+            grid = Grid(GridConfig(seed=case, size=size, density=density, num_agents=num_agents, obs_radius=2))
+        except OverflowError:
+            continue
+        for agent_idx in np.flatnonzero(rng.random(grid.config.num_agents) < 0.1):
+            grid.hide_agent(agent_idx)
+        yield grid, rng
+
+
+def priority_reference(grid, actions):
+    for agent_idx in range(grid.config.num_agents):
+        if grid.is_active[agent_idx]:
+            grid.move(agent_idx, actions[agent_idx])
+
+
+def block_both_reference(grid, actions):
+    used_cells = {}
+    agents_xy = grid.get_agents_xy()
+    for agent_idx, (x, y) in enumerate(agents_xy):
+        if grid.is_active[agent_idx]:
+            dx, dy = grid.config.MOVES[actions[agent_idx]]
+            used_cells[x + dx, y + dy] = 'blocked' if (x + dx, y + dy) in used_cells else 'visited'
+            used_cells[x, y] = 'blocked'
+    for agent_idx in range(grid.config.num_agents):
+        if grid.is_active[agent_idx]:
+            x, y = agents_xy[agent_idx]
+            dx, dy = grid.config.MOVES[actions[agent_idx]]
+            if used_cells.get((x + dx, y + dy), None) != 'blocked':
+                grid.move(agent_idx, actions[agent_idx])
+
+
+def soft_reference(grid, actions):
+    def revert_action(agent_idx, used_cells, cell):
+        actions[agent_idx] = 0
+        used_cells[cell].remove(agent_idx)
+        new_cell = grid.positions_xy[agent_idx]
+        if new_cell in used_cells and len(used_cells[new_cell]) > 0:
+            used_cells[new_cell].append(agent_idx)
+            return revert_action(used_cells[new_cell][0], used_cells, new_cell)
+        else:
+            used_cells.setdefault(new_cell, []).append(agent_idx)
+
+    actions = list(actions)
+    used_cells = dict()
+    used_edges = dict()
+    agents_xy = grid.get_agents_xy()
+    for agent_idx, (x, y) in enumerate(agents_xy):
+        if grid.is_active[agent_idx]:
+            dx, dy = grid.config.MOVES[actions[agent_idx]]
+            used_cells.setdefault((x + dx, y + dy), []).append(agent_idx)
+            used_edges[x, y, x + dx, y + dy] = [agent_idx]
+            if dx != 0 or dy != 0:
+                used_edges.setdefault((x + dx, y + dy, x, y), []).append(agent_idx)
+    for agent_idx, (x, y) in enumerate(agents_xy):
+        if grid.is_active[agent_idx]:
+            dx, dy = grid.config.MOVES[actions[agent_idx]]
+            if len(used_edges[x, y, x + dx, y + dy]) > 1:
+                used_cells[x + dx, y + dy].remove(agent_idx)
+                used_cells.setdefault((x, y), []).append(agent_idx)
+                actions[agent_idx] = 0
+    for agent_idx in reversed(range(len(agents_xy))):
+        x, y = agents_xy[agent_idx]
+        if grid.is_active[agent_idx]:
+            dx, dy = grid.config.MOVES[actions[agent_idx]]
+            if len(used_cells[x + dx, y + dy]) > 1 or grid.has_obstacle(x + dx, y + dy):
+                revert_action(agent_idx, used_cells, (x + dx, y + dy))
+    for agent_idx in range(grid.config.num_agents):
+        if grid.is_active[agent_idx]:
+            grid.move_without_checks(agent_idx, actions[agent_idx])
+
+
+def test_priority_fuzz():
+    for grid, rng in random_grids():
+        for _ in range(5):
+            actions = rng.integers(5, size=grid.config.num_agents)
+            reference = deepcopy(grid)
+            priority_reference(reference, actions)
+
+            cells, desired, legal = grid.get_desired_cells(actions)
+            grid.move_agents_to_cells(resolve_priority(cells, desired, grid.active, legal))
+
+            assert np.array_equal(grid.agents_xy, reference.agents_xy)
+            assert np.array_equal(grid.positions, reference.positions)
+
+
+def test_priority_chain():
+    # agents are standing in a row and everyone moves right, only the leader can free the cell for the next one
+    current = np.array([3, 2, 1, 0])
+    desired = current + 1
+    active = np.ones(4, dtype=bool)
+    legal = np.ones(4, dtype=bool)
+    assert resolve_priority(current, desired, active, legal).tolist() == [4, 3, 2, 1]
+    assert resolve_priority(current[::-1], desired[::-1], active, legal).tolist() == [0, 1, 2, 4]
+    legal[0] = False
+    assert resolve_priority(current, desired, active, legal).tolist() == [3, 2, 1, 0]
+
+
+def test_block_both_fuzz():
+    for grid, rng in random_grids(seed=1):
+        for _ in range(5):
+            actions = rng.integers(5, size=grid.config.num_agents)
+            reference = deepcopy(grid)
+            block_both_reference(reference, actions)
+
+            cells, desired, legal = grid.get_desired_cells(actions)
+            grid.move_agents_to_cells(resolve_block_both(cells, desired, grid.active, legal))
+
+            assert np.array_equal(grid.agents_xy, reference.agents_xy)
+            assert np.array_equal(grid.positions, reference.positions)
+
+
+def test_soft_fuzz():
+    for grid, rng in random_grids(num_cases=400, seed=2):
+        for _ in range(5):
+            actions = rng.integers(5, size=grid.config.num_agents)
+            reference = deepcopy(grid)
+            soft_reference(reference, actions)
+
+            cells, desired, legal = grid.get_desired_cells(actions)
+            grid.move_agents_to_cells(resolve_soft(cells, desired, grid.active, legal))
+
+            assert np.array_equal(grid.agents_xy, reference.agents_xy)
+            # the sequential move_without_checks could clear the cell just taken by an agent with a lower index,
+            # so the positions map is compared with the one built from scratch
+            expected_positions = np.zeros_like(grid.positions)
+            active_xy = grid.agents_xy[grid.active]
+            expected_positions[active_xy[:, 0], active_xy[:, 1]] = grid.config.OBSTACLE
+            assert np.array_equal(grid.positions, expected_positions)
+
+
+def test_soft_cycle_and_long_chain():
+    # four agents rotating in a 2x2 square on a 10x10 grid
+    current = np.array([0, 1, 11, 10])
+    desired = np.array([1, 11, 10, 0])
+    ones = np.ones(4, dtype=bool)
+    assert resolve_soft(current, desired, ones, ones).tolist() == desired.tolist()
+
+    # a train of agents following the leader is far deeper than the recursion limit
+    num_agents = 20000
+    current = np.arange(num_agents)[::-1].copy()
+    desired = current + 1
+    ones = np.ones(num_agents, dtype=bool)
+    assert (resolve_soft(current, desired, ones, ones) == desired).all()
+    ones[0] = False
+    assert (resolve_soft(current, desired, np.ones(num_agents, dtype=bool), ones) == current).all()
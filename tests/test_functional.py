@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from pogema import GridConfig, pogema_v0
+from pogema.functional import PogemaState, step
+
+
+@pytest.mark.parametrize('on_target', ['finish', 'restart', 'nothing'])
+@pytest.mark.parametrize('collision_system', ['priority', 'block_both', 'soft'])
+def test_batched_step_matches_env(on_target, collision_system):
+    gc = GridConfig(seed=4, size=8, num_agents=10, density=0.2, on_target=on_target,
+                    collision_system=collision_system)
+    env = pogema_v0(gc)
+    env.reset()
+    for _ in range(3):
+        env.step(env.sample_actions())
+
+    grid = env.grid
+    state = PogemaState(grid.agents_xy.copy(), grid.targets_xy.copy(), grid.active.copy())
+    num_candidates = 16
+    batch = PogemaState(*(np.repeat(array[None], num_candidates, axis=0) for array in state))
+    candidate_actions = np.random.default_rng(0).integers(0, 5, size=(num_candidates, gc.num_agents))
+
+    new_state, rewards, terminated = step(batch, candidate_actions, grid.legal_moves, gc.MOVES,
+                                          collision_system, on_target)
+    assert new_state.agents_xy.shape == (num_candidates, gc.num_agents, 2)
+    assert rewards.shape == terminated.shape == (num_candidates, gc.num_agents)
+    # the inputs are not changed
+    assert all((array == expected).all() for array, expected in zip(batch, state))
+    assert np.array_equal(grid.agents_xy, state.agents_xy)
+
+    snapshot = env.get_snapshot()
+    for candidate_idx, actions in enumerate(candidate_actions):
+        env.restore(snapshot)
+        _, env_rewards, env_terminated, _, infos = env.step(actions)
+        assert np.array_equal(new_state.agents_xy[candidate_idx], env.grid.agents_xy)
+        assert rewards[candidate_idx].tolist() == env_rewards
+        assert terminated[candidate_idx].tolist() == env_terminated
+        if on_target != 'restart':
+            assert new_state.active[candidate_idx].tolist() == [info['is_active'] for info in infos]
@@ -265,3 +265,321 @@ def test_restricted_grid():
     with pytest.raises(OverflowError):
         env = pogema_v0(grid_config=GridConfig(map=grid, num_agents=25, seed=0, obs_radius=2))
         env.reset()
+
+
+def test_array_backed_agents_state():
+    grid = Grid(GridConfig(seed=1, obs_radius=2, size=12, num_agents=10, density=0.2))
+    assert grid.agents_xy.shape == (10, 2) and grid.agents_xy.dtype == np.int32
+    assert grid.targets_xy.shape == (10, 2) and grid.targets_xy.dtype == np.int32
+    assert grid.active.dtype == bool and grid.active.all()
+
+    x, y = grid.positions_xy[3]
+    assert isinstance(x, int) and (x, y) == tuple(grid.agents_xy[3])
+
+    grid.finishes_xy[0] = grid.positions_xy[0]
+    assert grid.on_goal(0) and grid.on_goal_mask()[0]
+
+    grid.hide_agent(1)
+    assert grid.is_active[1] is False and not grid.active[1]
+    assert len(grid.get_agents_xy(only_active=True)) == 9
+
+
+def test_occupancy_index():
+    from pogema.collisions import find_occupants
+
+    def expected_occupancy(grid):
+        occupancy = np.full(grid.obstacles.shape, -1)
+        for agent_idx in np.flatnonzero(grid.active):
+            occupancy[tuple(grid.agents_xy[agent_idx])] = agent_idx
+        return occupancy
+
+    for collision_system in ['priority', 'block_both', 'soft']:
+        for on_target in ['finish', 'nothing']:
+            env = pogema_v0(GridConfig(seed=3, size=8, num_agents=16, density=0.2, collision_system=collision_system,
+                                       on_target=on_target, max_episode_steps=32))
+            env.reset()
+            for _ in range(32):
+                env.step(env.sample_actions())
+                grid = env.grid
+                assert np.array_equal(grid.occupancy, expected_occupancy(grid))
+                cells = np.arange(grid.obstacles.size)
+                assert np.array_equal(grid.get_occupants(cells),
+                                      find_occupants(grid.get_agents_cells(), grid.active, cells))
+
+    grid = Grid(GridConfig(seed=1, obs_radius=2, size=12, num_agents=10, density=0.2))
+    x, y = grid.positions_xy[4]
+    assert grid.get_agent_at(x, y) == 4
+    grid.hide_agent(4)
+    assert grid.get_agent_at(x, y) == -1
+    grid.show_agent(4)
+    assert grid.get_agent_at(x, y) == 4
+    grid.move(4, 0)
+    assert np.array_equal(grid.occupancy, expected_occupancy(grid))
+
+
+def test_legal_moves_mask():
+    grid_map = """
+        .-|.
+        .%#.
+        a..A
+    """
+    grid = Grid(GridConfig(obs_radius=1, map=grid_map))
+    stay, up, down, left, right = [1 << action for action in range(5)]
+
+    assert grid.legal_moves[1, 1] == stay | down | right
+    # '-' allows only left/right, the cell below has stocks which are passable in the environment
+    assert grid.legal_moves[1, 2] == stay | left | right
+    # '|' allows only up/down, but both are blocked by the border and the obstacle
+    assert grid.legal_moves[1, 3] == stay
+    assert grid.get_legal_moves('standard')[2, 1] == stay | up | down
+    assert grid.get_legal_moves('small')[2, 1] == stay | up | down | right
+
+    for from_x, from_y in zip(*np.nonzero(grid.obstacles == 0)):
+        for action, (dx, dy) in enumerate(grid.config.MOVES[1:], start=1):
+            expected = grid.is_move_valid((from_x, from_y), (from_x + dx, from_y + dy)) and \
+                       not grid.has_obstacle(from_x + dx, from_y + dy)
+            assert bool(grid.legal_moves[from_x, from_y] >> action & 1) == expected
+
+    # unknown direction types permit only staying
+    from pogema.utils import get_legal_moves_mask
+    mask = get_legal_moves_mask(np.zeros((2, 2), dtype=bool), np.array([[0, 7], [-1, 2]]), grid.config.MOVES)
+    assert mask.tolist() == [[stay | down | right, stay], [stay, stay | up]]
+
+
+def test_directions_are_respected_by_env():
+    grid_map = """
+        a-.
+        ..A
+    """
+    env = pogema_v0(GridConfig(obs_radius=1, map=grid_map, max_episode_steps=8))
+    env.reset()
+    # right to the '-' cell, then down is forbidden
+    env.step([4])
+    env.step([2])
+    assert env.grid.get_agents_xy(ignore_borders=True) == [[0, 1]]
+    env.step([4])
+    env.step([2])
+    assert env.grid.get_agents_xy(ignore_borders=True) == [[1, 2]]
+
+
+def test_action_masks():
+    env = pogema_v0(GridConfig(seed=5, size=8, num_agents=20, density=0.3, on_target='finish', max_episode_steps=32))
+    env.reset()
+    for _ in range(32):
+        env.step(env.sample_actions())
+        grid = env.grid
+        masks = grid.get_action_masks()
+        assert masks.shape == (20, 5)
+        for agent_idx, (x, y) in enumerate(grid.positions_xy):
+            for action, (dx, dy) in enumerate(grid.config.MOVES):
+                if not grid.is_active[agent_idx]:
+                    expected = action == 0
+                else:
+                    expected = not grid.has_obstacle(x + dx, y + dy) and grid.get_agent_at(x + dx, y + dy) in [-1, agent_idx]
+                assert masks[agent_idx, action] == expected
+
+
+def test_parsed_map_cache():
+    grid_map = """
+        .a.#|
+        .-%#.
+        ..A..
+    """
+    first, second = GridConfig(map=grid_map, seed=1), GridConfig(map=grid_map, seed=2)
+    assert all(a is b for a, b in zip(first.map, second.map))
+    assert not first.map[0].flags.writeable
+    assert first.agents_xy == [[0, 1]] and first.targets_xy == [[2, 2]]
+    assert first.size == 5 and np.isclose(first.density, 2 / 15)
+
+    grid = Grid(first)
+    r = first.obs_radius
+    assert grid.obstacles.flags.writeable
+    assert np.array_equal(grid.get_obstacles(ignore_borders=True), first.map[0])
+    assert np.array_equal(grid.get_stocks(ignore_borders=True), first.map[1])
+    assert np.array_equal(grid.get_directions(ignore_borders=True), [[0, 0, 0, 0, 2], [0, 1, 0, 0, 0], [0] * 5])
+    assert grid.get_agents_xy() == [(r, r + 1)]
+
+    # rows given as arrays aren't parsed layers
+    config = GridConfig(map=[np.array([0, 1, 0]), np.array([0, 0, 0]), np.array([1, 0, 0])])
+    assert config.size == 3 and np.isclose(config.density, 2 / 9)
+    assert config.map[0].tolist() == [[0, 1, 0], [0, 0, 0], [1, 0, 0]]
+
+    config = GridConfig(map=[[0, 0, 1], [0], [0, 0]])
+    assert config.size == 3 and np.isclose(config.density, 1 / 6)
+    assert config.map[0].tolist() == [[0, 0, 1], [0, 1, 1], [0, 0, 1]]
+
+
+def test_connected_components():
+    from pogema.generator import connected_components
+    grid = np.array([[0, 1, 0, 0],
+                     [0, 1, 1, 0],
+                     [0, 0, 1, 0],
+                     [1, 1, 1, 0]])
+    labels, sizes = connected_components(grid)
+    assert labels.dtype == np.int32
+    assert np.array_equal(labels, [[0, -1, 1, 1],
+                                   [0, -1, -1, 1],
+                                   [0, 0, -1, 1],
+                                   [-1, -1, -1, 1]])
+    assert sizes.tolist() == [4, 5]
+
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        grid = rng.binomial(1, 0.4, (16, 16))
+        labels, sizes = connected_components(grid)
+        assert np.array_equal(labels >= 0, grid == 0)
+        assert np.array_equal(np.bincount(labels[labels >= 0], minlength=len(sizes)), sizes)
+        # neighbouring free cells always share the label
+        assert np.all((labels[:-1] == labels[1:]) | (labels[:-1] < 0) | (labels[1:] < 0))
+        assert np.all((labels[:, :-1] == labels[:, 1:]) | (labels[:, :-1] < 0) | (labels[:, 1:] < 0))
+
+
+def test_union_find_comb(monkeypatch):
+    from pogema import utils
+    from pogema.generator import connected_components
+
+    passes = []
+    find_roots = utils._find_roots
+    monkeypatch.setattr(utils, '_find_roots', lambda parent: passes.append(1) or find_roots(parent))
+    # the teeth are linked only through the spine in the last row, which is the highest run
+    grid = np.zeros((256, 256), dtype=np.int32)
+    grid[:-1, 1::2] = 1
+    labels, sizes = connected_components(grid)
+    assert sizes.tolist() == [int((grid == 0).sum())]
+    assert len(passes) <= 2
+
+
+def test_component_index():
+    from pogema.generator import build_component_index, generate_new_targets
+    obstacles = np.array([[0, 1, 0, 0],
+                          [0, 1, 1, 0],
+                          [0, 0, 1, 0],
+                          [1, 1, 1, 0]])
+    index = build_component_index(obstacles)
+    assert index.offsets.tolist() == [0, 4, 9]
+    assert index.flat_cell_indices.tolist() == [0, 4, 8, 9, 2, 3, 7, 11, 15]
+    assert index.get_component((2, 1)) == 0 and index.get_component((3, 3)) == 1
+
+    targets = generate_new_targets(0, np.zeros(50, dtype=np.int64), np.arange(50), index, np.tile([0, 2], (50, 1)))
+    assert all(tuple(target) != (0, 2) and index.get_component(target) == 1 for target in targets)
+    # the only cell of the component is the target again
+    assert generate_new_targets(0, [0], [0], build_component_index(np.array([[0, 1]])), [[0, 0]]).tolist() == [[0, 0]]
+
+
+def test_placing_flat():
+    from pogema.generator import generate_positions_and_targets_fast, label_components
+    grid_config = GridConfig(size=32, density=0.4, num_agents=128, seed=3)
+    obstacles = np.random.default_rng(3).binomial(1, grid_config.density, (32, 32))
+    labels, sizes = label_components(obstacles, grid_config)
+    starts, targets = generate_positions_and_targets_fast(obstacles, grid_config)
+    assert len(starts) == len(targets) == 128
+    assert len(set(starts) | set(targets)) == 256
+    for start, target in zip(starts, targets):
+        assert obstacles[start] == obstacles[target] == grid_config.FREE
+        assert labels[start] == labels[target]
+    assert (starts, targets) == generate_positions_and_targets_fast(obstacles, grid_config, (labels, sizes))
+
+    # not enough free cells, the targets of the missing agents are (-1, -1)
+    starts, targets = generate_positions_and_targets_fast(np.array([[0, 0, 0, 1]]), grid_config)
+    assert len(starts) == 1 and starts[0] != targets[0]
+    assert len(targets) == 128 and targets[1:] == [(-1, -1)] * 127
+
+
+def test_check_grid():
+    from pogema.utils import check_grid, get_unreachable_targets
+    obstacles = np.array([[0, 0, 1, 0],
+                          [0, 0, 1, 0],
+                          [0, 0, 1, 0]])
+    check_grid(obstacles, [[0, 0], [2, 1]], [[2, 0], [0, 1]])
+    with pytest.raises(ValueError, match="overlap"):
+        check_grid(obstacles, [[0, 0], [1, 1], [0, 0]], [[2, 0], [0, 1], [1, 0]])
+    with pytest.raises(KeyError):
+        check_grid(obstacles, [[0, 0], [2, 1]], [[2, 0], [0, 2]])
+    with pytest.raises(ValueError, match="unreachable"):
+        check_grid(obstacles, [[0, 0], [2, 1]], [[2, 0], [0, 3]])
+
+    # '|' cell can be entered from the side, but can be left only vertically
+    directions = np.zeros_like(obstacles)
+    directions[:, 3] = 2
+    obstacles[:, 2] = 0
+    unreachable = get_unreachable_targets(obstacles, [[0, 0], [0, 3], [0, 3]], [[0, 3], [0, 0], [2, 3]], directions)
+    assert unreachable.tolist() == [1]
+    with pytest.raises(ValueError, match="agent 1"):
+        check_grid(obstacles, [[0, 0], [0, 3]], [[0, 3], [0, 0]], directions)
+
+
+def test_counter_based_targets():
+    from pogema.generator import build_component_index, generate_new_targets
+    obstacles = np.array([[0, 1, 0, 0],
+                          [0, 1, 1, 0],
+                          [0, 0, 1, 0],
+                          [1, 1, 1, 0]])
+    index = build_component_index(obstacles)
+    positions = np.array([[0, 0], [0, 2], [3, 3]])
+    targets = generate_new_targets(7, np.arange(3), np.zeros(3), index, positions)
+    for position, target in zip(positions, targets):
+        assert tuple(target) != tuple(position)
+        assert index.get_component(target) == index.get_component(position)
+
+    # the targets of an agent depend only on the key, the agent, the goal index and the position
+    assert np.array_equal(generate_new_targets(7, [2], [0], index, positions[2:]), targets[2:])
+    assert np.array_equal(generate_new_targets(7, np.arange(3), np.zeros(3), index, positions), targets)
+    samples = {tuple(generate_new_targets(7, [0], [goal], index, [[0, 0]])[0]) for goal in range(100)}
+    assert samples == {(1, 0), (2, 0), (2, 1)}
+
+
+def test_generate_warehouse():
+    from pogema.generator import generate_warehouse
+    from pogema.utils import get_unreachable_targets
+    grid_config = GridConfig(size=11, seed=3)
+    obstacles, stocks, directions = generate_warehouse(grid_config, shelf_length=3, obstacle_density=0.0)
+    assert obstacles.dtype == stocks.dtype == directions.dtype == np.int32
+    assert directions[0].tolist() == [0, 1, 1, 0, 1, 1, 0, 1, 1, 0, 0]
+    assert directions[:, 0].tolist() == [0, 2, 2, 2, 0, 2, 2, 2, 0, 2, 0]
+    assert stocks[1].tolist() == [0, 1, 1, 0, 1, 1, 0, 1, 1, 0, 0]
+    assert not obstacles.any()
+
+    free = np.argwhere(obstacles == grid_config.FREE)
+    starts, targets = np.repeat(free, len(free), axis=0), np.tile(free, (len(free), 1))
+    assert len(get_unreachable_targets(obstacles, starts, targets, directions)) == 0
+
+    layers = generate_warehouse(grid_config, stock_density=0.5, obstacle_density=0.2)
+    assert all(np.array_equal(a, b) for a, b in zip(layers, generate_warehouse(grid_config, stock_density=0.5,
+                                                                               obstacle_density=0.2)))
+    assert not (layers[0] & layers[1]).any()
+
+    grid = Grid(GridConfig(map=layers, num_agents=4, seed=0))
+    assert np.array_equal(grid.get_directions(ignore_borders=True), layers[2])
+
+
+def test_a_star_vehicle_aware():
+    from pogema.a_star_policy import GridMemory, a_star_vehicle_aware
+
+    memory = GridMemory(start_r=2)
+    obstacles = np.zeros((5, 5))
+    obstacles[1:4, 2] = 1
+    memory.update(0, 0, obstacles)
+
+    path = a_star_vehicle_aware((0, -1), (0, 1), memory)
+    assert path[0] == (0, -1) and path[-1] == (0, 1)
+    assert all(not memory.is_obstacle(x, y) for x, y in path)
+    assert all(abs(x1 - x2) + abs(y1 - y2) == 1 for (x1, y1), (x2, y2) in zip(path, path[1:]))
+    assert len(path) == 7
+
+    # the target far outside the memory is still reached, the cells outside the memory are free
+    path = a_star_vehicle_aware((0, -1), (300, -1), memory)
+    assert len(path) == 301 and path[-1] == (300, -1)
+    assert a_star_vehicle_aware((0, 0), (300, 0), memory, max_steps=10) == []
+
+
+def test_grid_memory_legal_moves_update():
+    from pogema.a_star_policy import GridMemory
+
+    rng = np.random.default_rng(0)
+    memory = GridMemory(start_r=4)
+    for x, y in [(0, 0), (1, 0), (2, 0), (2, 1), (-3, 1), (-4, 1), (-5, 1)]:
+        window = rng.random((3, 3, 3)) < 0.3
+        memory.update(x, y, window[0], window[1], rng.integers(0, 3, (3, 3)))
+        cached = memory.get_legal_moves('standard').copy()
+        memory._legal_moves = {}
+        assert np.array_equal(cached, memory.get_legal_moves('standard'))
@@ -0,0 +1,44 @@
+import numpy as np
+
+from pogema import GridConfig
+from pogema.grid import Grid
+from pogema.instance_cache import generate_instances, get_config_fingerprint, load_instance, save_instance, \
+    Instance
+
+
+def test_config_fingerprint():
+    base = GridConfig(size=16, num_agents=4, seed=1)
+    assert get_config_fingerprint(base) == get_config_fingerprint(GridConfig(size=16, num_agents=4, seed=2,
+                                                                             obs_radius=3))
+    assert get_config_fingerprint(base) != get_config_fingerprint(GridConfig(size=16, num_agents=5, seed=1))
+    assert get_config_fingerprint(GridConfig(map='..#\n...')) != get_config_fingerprint(GridConfig(map='...\n..#'))
+
+
+def test_generate_instances(tmp_path):
+    base = GridConfig(size=16, num_agents=8, density=0.3)
+    paths = generate_instances(base, range(4), str(tmp_path), num_workers=2)
+    assert len(set(paths)) == 4
+
+    for seed in range(4):
+        config = base.copy(update=dict(seed=seed))
+        instance = load_instance(str(tmp_path), config)
+        grid = Grid(config)
+        cached_grid = Grid(config.copy(update=dict(instance_cache_dir=str(tmp_path))))
+        r = config.obs_radius
+        assert np.array_equal(instance.obstacles, grid.get_obstacles(ignore_borders=True))
+        assert np.array_equal(instance.starts_xy + r, grid.agents_xy)
+        for name in ['obstacles', 'agents_xy', 'targets_xy', 'legal_moves']:
+            assert np.array_equal(getattr(grid, name), getattr(cached_grid, name))
+
+    assert load_instance(str(tmp_path), base) is None
+    assert load_instance(str(tmp_path), base.copy(update=dict(seed=4))) is None
+
+
+def test_grid_loads_cached_instance(tmp_path):
+    config = GridConfig(size=4, num_agents=1, seed=0, obs_radius=1, instance_cache_dir=str(tmp_path))
+    obstacles = np.array([[0, 0, 1, 0], [0, 0, 1, 0], [0, 0, 0, 0], [1, 1, 1, 1]], dtype=np.int8)
+    save_instance(str(tmp_path), config, Instance(obstacles=obstacles, starts_xy=np.array([[0, 0]], dtype=np.int32),
+                                                  targets_xy=np.array([[2, 3]], dtype=np.int32)))
+    grid = Grid(config)
+    assert np.array_equal(grid.get_obstacles(ignore_borders=True), obstacles)
+    assert grid.get_agents_xy() == [(1, 1)] and grid.get_targets_xy() == [(3, 4)]
@@ -119,3 +119,27 @@ def test_petting_zoo():
         # render_test(lambda: pogema_v0(gc))
     except ImportError:
         pass
+
+
+def test_action_masks_in_integrations():
+    gc = GridConfig(seed=7, num_agents=8, size=8, density=0.3, max_episode_steps=16)
+
+    pymarl_env = pogema_v0(gc.copy(update=dict(integration='PyMARL')))
+    avail_actions = pymarl_env.get_avail_actions()
+    assert avail_actions == pymarl_env.env.get_action_masks().astype(int).tolist()
+    assert avail_actions[3] == pymarl_env.get_avail_agent_actions(3)
+    assert all(actions[0] == 1 for actions in avail_actions)
+
+    pomapf_env = pogema_v0(gc.copy(update=dict(observation_type='POMAPF')))
+    obs, _ = pomapf_env.reset()
+    assert np.array_equal(np.array([o['action_mask'] for o in obs]), pomapf_env.get_action_masks())
+
+    petting_zoo_env = pogema_v0(gc.copy(update=dict(integration='PettingZoo')))
+    _, infos = petting_zoo_env.reset(return_info=True)
+    masks = petting_zoo_env.pogema.get_action_masks()
+    for agent, idx in petting_zoo_env.agent_name_mapping.items():
+        assert np.array_equal(infos[agent]['action_mask'], masks[idx])
+    _, _, _, _, infos = petting_zoo_env.step({agent: 0 for agent in petting_zoo_env.agents})
+    masks = petting_zoo_env.pogema.get_action_masks()
+    for agent, idx in petting_zoo_env.agent_name_mapping.items():
+        assert np.array_equal(infos[agent]['action_mask'], masks[idx])
@@ -258,3 +258,115 @@ def test_steps_per_second_throughput():
                 steps_per_second = gc.max_episode_steps / (end_time - start_time)
                 table.append([on_target, num_agents, size, steps_per_second * gc.num_agents])
     print('\n' + tabulate(table, headers=['on_target', 'num_agents', 'size', 'SPS (individual)'], tablefmt='grid'))
+
+
+def test_batched_observations_match_per_agent():
+    for on_target in ['finish', 'nothing', 'restart']:
+        env = pogema_v0(GridConfig(num_agents=16, size=12, obs_radius=3, density=0.3, seed=7, on_target=on_target))
+        env.reset()
+        for _ in range(16):
+            env.step(env.sample_actions())
+            batch = env.unwrapped._get_agents_obs_batch()
+            assert batch.shape == (16, 4, 7, 7) and batch.dtype == np.float32
+            for agent_idx in range(env.get_num_agents()):
+                assert (batch[agent_idx] == env.unwrapped._get_agents_obs(agent_idx)).all()
+
+
+def test_reused_observation_buffer():
+    gc = GridConfig(num_agents=8, size=8, obs_radius=2, density=0.3, seed=3, reuse_obs_buffer=True)
+    env, reference_env = pogema_v0(gc), pogema_v0(gc.copy(update=dict(reuse_obs_buffer=False)))
+    buffer = env.get_obs_buffer()
+    assert buffer.shape == (8, 4, 5, 5)
+
+    obs, _ = env.reset()
+    reference_obs, _ = reference_env.reset()
+    for _ in range(8):
+        assert all(np.shares_memory(o, buffer) for o in obs)
+        assert np.array_equal(np.array(obs), np.array(reference_obs))
+        actions = env.sample_actions()
+        obs, *_ = env.step(actions)
+        reference_obs, *_ = reference_env.step(actions)
+
+    with pytest.raises(ValueError):
+        env.set_obs_buffer(np.zeros((8, 4, 5, 5), dtype=np.float64))
+
+
+@pytest.mark.parametrize('on_target', ['finish', 'restart', 'nothing'])
+def test_fast_reset(on_target):
+    grid_map = """
+        ....#....
+        .#..#..#.
+        .#.....#.
+        ...###...
+        .#.....#.
+        ....#....
+    """
+    gc = GridConfig(map=grid_map, num_agents=4, obs_radius=2, seed=3, on_target=on_target, max_episode_steps=16)
+    env = pogema_v0(gc.copy(update=dict(fast_reset=True)))
+    env.reset()
+    obstacles, legal_moves = env.grid.obstacles, env.grid.legal_moves
+
+    for seed in [None, 7, 8, None]:
+        expected_env = pogema_v0(gc if seed is None else gc.copy(update=dict(seed=seed)))
+        expected_obs, _ = expected_env.reset()
+        obs, _ = env.reset(seed=seed)
+        assert env.grid.obstacles is obstacles and env.grid.legal_moves is legal_moves
+        assert np.array_equal(np.array(obs), np.array(expected_obs))
+
+        rnd = np.random.default_rng(seed)
+        for _ in range(16):
+            actions = rnd.integers(0, 5, size=gc.num_agents)
+            obs, rewards, terminated, truncated, _ = env.step(actions)
+            expected_obs, expected_rewards, expected_terminated, expected_truncated, _ = expected_env.step(actions)
+            assert np.array_equal(np.array(obs), np.array(expected_obs))
+            assert rewards == expected_rewards and terminated == expected_terminated
+            assert truncated == expected_truncated
+
+
+@pytest.mark.parametrize('on_target', ['finish', 'restart', 'nothing'])
+def test_snapshot_and_restore(on_target):
+    env = pogema_v0(GridConfig(seed=2, size=8, num_agents=6, density=0.2, obs_radius=2, max_episode_steps=32,
+                               on_target=on_target))
+    env.reset()
+    for _ in range(5):
+        env.step(env.sample_actions())
+
+    snapshot = env.get_snapshot()
+    obstacles = env.grid.obstacles
+    rnd = np.random.default_rng(0)
+    actions = [rnd.integers(0, 5, size=6) for _ in range(27)]
+
+    def rollout():
+        results = []
+        for action in actions:
+            obs, rewards, terminated, truncated, _ = env.step(action)
+            results.append((np.array(obs), rewards, terminated, truncated, env.get_targets_xy()))
+        return results
+
+    expected = rollout()
+    for reset_before in [False, True]:
+        if reset_before:
+            env.reset()
+        env.restore(snapshot)
+        assert env.grid.obstacles is obstacles
+        for (obs, rewards, terminated, truncated, targets), expected_result in zip(rollout(), expected):
+            assert np.array_equal(obs, expected_result[0])
+            assert (rewards, terminated, truncated, targets) == expected_result[1:]
+
+
+def test_lifelong_snapshot_without_seed():
+    env = pogema_v0(GridConfig(size=4, num_agents=2, density=0.0, obs_radius=2, on_target='restart'))
+    env.reset()
+    snapshot = env.get_snapshot()
+    rnd = np.random.default_rng(0)
+    actions = [rnd.integers(0, 5, size=2) for _ in range(64)]
+
+    def rollout():
+        return [(env.step(action), env.get_targets_xy())[1] for action in actions]
+
+    expected = rollout()
+    assert expected[0] != expected[-1]
+    # the seedless reset draws a new key of the lifelong targets, restore brings the snapshotted one back
+    env.reset()
+    env.restore(snapshot)
+    assert rollout() == expected
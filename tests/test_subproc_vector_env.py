@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from pogema import GridConfig, pogema_v0
+from pogema.subproc_vector_env import PogemaSubprocVectorEnv, PogemaAsyncEnvPool
+
+
+@pytest.mark.parametrize('on_target', ['finish', 'restart', 'nothing'])
+def test_subproc_vector_env_matches_single_envs(on_target):
+    num_envs = 3
+    gc = GridConfig(seed=5, size=8, num_agents=4, density=0.2, obs_radius=2, max_episode_steps=16,
+                    on_target=on_target)
+    envs = [pogema_v0(gc.copy(update=dict(seed=gc.seed + idx))) for idx in range(num_envs)]
+
+    with PogemaSubprocVectorEnv(gc, num_envs=num_envs, num_workers=2) as vector_env:
+        obs, infos = vector_env.reset()
+        assert obs.shape == (num_envs, gc.num_agents, 4, 5, 5)
+        for idx, env in enumerate(envs):
+            assert np.array_equal(obs[idx], np.array(env.reset()[0]))
+
+        rnd = np.random.default_rng(0)
+        num_finished = 0
+        for _ in range(40):
+            actions = rnd.integers(0, 5, size=(num_envs, gc.num_agents))
+            obs, rewards, terminated, truncated, infos = vector_env.step(actions)
+            num_finished += len(infos['metrics'])
+            for idx, env in enumerate(envs):
+                single_obs, single_rewards, single_terminated, single_truncated, single_infos = env.step(actions[idx])
+                assert np.array_equal(rewards[idx], single_rewards)
+                assert np.array_equal(terminated[idx], single_terminated)
+                assert np.array_equal(truncated[idx], single_truncated)
+                if all(single_terminated) or all(single_truncated):
+                    assert infos['done'][idx]
+                    assert infos['metrics'][idx] == single_infos[0]['metrics']
+                    single_obs, single_infos = env.reset()
+                assert np.array_equal(obs[idx], np.array(single_obs))
+                assert np.array_equal(infos['is_active'][idx], [info['is_active'] for info in single_infos])
+        assert num_finished >= num_envs
+
+
+def test_subproc_vector_env_validation():
+    with pytest.raises(ValueError):
+        PogemaSubprocVectorEnv(GridConfig(observation_type='MAPF'), num_envs=2)
+
+
+def test_async_env_pool():
+    num_envs = 4
+    gc = GridConfig(seed=3, size=8, num_agents=4, density=0.2, obs_radius=2, max_episode_steps=8)
+    envs = [pogema_v0(gc.copy(update=dict(seed=gc.seed + idx))) for idx in range(num_envs)]
+    expected_obs = [np.array(env.reset()[0]) for env in envs]
+    rnd = [np.random.default_rng(idx) for idx in range(num_envs)]
+    num_steps = np.zeros(num_envs, dtype=int)
+
+    with PogemaAsyncEnvPool(gc, num_envs=num_envs, batch_size=2, num_workers=num_envs) as pool:
+        pool.async_reset()
+        for _ in range(30):
+            obs, rewards, terminated, truncated, infos = pool.recv()
+            assert obs.shape == (2, gc.num_agents, 4, 5, 5)
+            for env_idx, env_obs in zip(infos['env_id'], obs):
+                assert np.array_equal(env_obs, expected_obs[env_idx])
+
+            actions = np.array([rnd[env_idx].integers(0, 5, size=gc.num_agents) for env_idx in infos['env_id']])
+            with pytest.raises(ValueError):
+                pool.send(actions[:1], [next(idx for idx in range(num_envs) if idx not in infos['env_id'])])
+            pool.send(actions)
+
+            for env_idx, env_actions in zip(infos['env_id'], actions):
+                single_obs, _, terminated, truncated, _ = envs[env_idx].step(env_actions)
+                if all(terminated) or all(truncated):
+                    single_obs, _ = envs[env_idx].reset()
+                expected_obs[env_idx] = np.array(single_obs)
+                num_steps[env_idx] += 1
+        assert num_steps.sum() == 60
+
+        with pytest.raises(ValueError):
+            pool.recv(batch_size=num_envs + 1)
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from pogema import GridConfig
+from pogema.envs import _make_pogema
+from pogema.vector_env import PogemaVectorEnv
+
+
+@pytest.mark.parametrize('on_target', ['finish', 'restart', 'nothing'])
+@pytest.mark.parametrize('collision_system', ['priority', 'block_both', 'soft'])
+@pytest.mark.parametrize('fast_reset', [False, True])
+def test_vector_env_matches_single_envs(on_target, collision_system, fast_reset):
+    num_envs = 3
+    gc = GridConfig(seed=11, size=8, num_agents=6, density=0.2, obs_radius=2, max_episode_steps=24,
+                    on_target=on_target, collision_system=collision_system)
+    vector_env = PogemaVectorEnv(gc.copy(update=dict(fast_reset=fast_reset)), num_envs=num_envs)
+    envs = [_make_pogema(gc.copy(update=dict(seed=gc.seed + idx))) for idx in range(num_envs)]
+
+    obs, _ = vector_env.reset()
+    assert obs.shape == (num_envs, gc.num_agents, 4, 5, 5)
+    for idx, env in enumerate(envs):
+        single_obs, _ = env.reset()
+        assert np.array_equal(obs[idx], np.array(single_obs))
+
+    rnd = np.random.default_rng(0)
+    num_resets = 0
+    for _ in range(60):
+        actions = rnd.integers(0, 5, size=(num_envs, gc.num_agents))
+        obs, rewards, terminated, truncated, infos = vector_env.step(actions)
+        num_resets += infos['done'].sum()
+        for idx, env in enumerate(envs):
+            single_obs, single_rewards, single_terminated, single_truncated, _ = env.step(actions[idx])
+            assert np.array_equal(rewards[idx], single_rewards)
+            assert np.array_equal(terminated[idx], single_terminated)
+            assert np.array_equal(truncated[idx], single_truncated)
+            if all(single_terminated) or all(single_truncated):
+                single_obs, _ = env.reset()
+            assert np.array_equal(obs[idx], np.array(single_obs))
+            assert env.grid.get_agents_xy() == vector_env.envs[idx].grid.get_agents_xy()
+            assert np.array_equal(env.grid.occupancy, vector_env.occupancy[idx])
+    assert num_resets >= num_envs
+
+
+def test_vector_env_validation():
+    with pytest.raises(ValueError):
+        PogemaVectorEnv(GridConfig(observation_type='POMAPF'), num_envs=2)
+    with pytest.raises(ValueError):
+        PogemaVectorEnv(GridConfig(), num_envs=0)
+
+
+@pytest.mark.parametrize('on_target', ['nothing', 'restart'])
+def test_vector_env_fast_reset_after_reseed(on_target):
+    grid_map = (np.random.default_rng(0).random((8, 8)) < 0.2).astype(int).tolist()
+    gc = GridConfig(seed=11, map=grid_map, num_agents=4, obs_radius=2, max_episode_steps=4, on_target=on_target)
+    fast_env = PogemaVectorEnv(gc.copy(update=dict(fast_reset=True)), num_envs=2)
+    full_env = PogemaVectorEnv(gc, num_envs=2)
+
+    # the automatic resets keep the seeds of the explicit reset, also when the grid was created with another seed
+    for env in [fast_env, full_env]:
+        env.reset()
+        env.reset(seed=100)
+    rnd = np.random.default_rng(0)
+    for _ in range(12):
+        actions = rnd.integers(0, 5, size=(2, gc.num_agents))
+        fast_obs, *_ = fast_env.step(actions)
+        full_obs, *_ = full_env.step(actions)
+        assert np.array_equal(fast_obs, full_obs)
+        assert np.array_equal(fast_env.agents_xy, full_env.agents_xy)
+        assert np.array_equal(fast_env.targets_xy, full_env.targets_xy)